@@ -22,7 +22,7 @@ async def process_one(upload_file, progress=gr.Progress(track_tqdm=True)):
     processed = preprocess_file(file_path, Path("data/processed"))
 
     progress(0.3, "OCR 识别中...")
-    text = await run_ocr_async(processed)
+    text = (await run_ocr_async(processed)).text
 
     progress(0.5, "类型识别中...")
     doc_type = await rule_classify(text)
@@ -3,7 +3,9 @@ from pathlib import Path
 import asyncio
 import json
 
-from src.pre_processor import preprocess_file
+from src.orientation import fix_orientation
+from src.pre_processor import preprocess_pages
+from src.preprocess_cache import PreprocessCache
 from src.rulebased_classifier import rule_classify, run_ocr_async
 from src.run_model import run_one_file
 
@@ -15,22 +17,31 @@ PROMPT_MAP = {
     "other": "prompts/other_prompt.txt"
 }
 
+PREPROCESS_CACHE = PreprocessCache("data/processed/cache")
+
 
 async def process_one(upload_file, progress=gr.Progress(track_tqdm=True)):
     progress(0.1, "预处理文件...")
     file_path = Path(upload_file.name)
 
-    processed = preprocess_file(file_path, Path("data/processed"))
+    pages = preprocess_pages(
+        file_path, Path("data/processed"), in_memory=True, cache=PREPROCESS_CACHE
+    )
+
+    # off the event loop: the direction check runs an ONNX model
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(None, fix_orientation, p) for p in pages])
 
     progress(0.3, "OCR 识别中...")
-    text = await run_ocr_async(processed)
+    results = await asyncio.gather(*[run_ocr_async(p) for p in pages])
+    text = "\n".join(r.text for r in results)
 
     progress(0.5, "类型识别中...")
     doc_type = await rule_classify(text)
 
     progress(0.7, "字段抽取中...")
     prompt_path = PROMPT_MAP.get(doc_type)
-    result = await run_one_file(processed, prompt_path)
+    result = await run_one_file(pages, prompt_path)
 
     try:
         fields = json.loads(result["output"])
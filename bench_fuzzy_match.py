@@ -0,0 +1,123 @@
+"""
+Compare the compiled keyword matcher (src.fuzzy_match) with the previous
+sliding-window SequenceMatcher fuzzy_contains on rule_classify's keywords.
+
+    python bench_fuzzy_match.py [--lengths 500 3000 10000] [--noise 0.1]
+
+Texts are the synthetic itineraries' .docx text, cut or repeated to each
+length, plus a copy with a share of characters replaced or dropped to
+imitate OCR errors (so the fuzzy path is exercised, not only exact hits).
+For every text both implementations must find the same keywords; the
+per-document time of each is reported and written to
+outputs/fuzzy_match_benchmark.json.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from src.artifacts import ARTIFACTS_DIR, docx_lines
+from src.fuzzy_match import KeywordMatcher
+from src.rulebased_classifier import FUZZY_THRESHOLD, KEYWORDS
+
+OUTPUT_PATH = Path("outputs/fuzzy_match_benchmark.json")
+
+
+def sliding_fuzzy_contains(text: str, keyword: str, threshold: float = FUZZY_THRESHOLD) -> bool:
+    """The previous rulebased_classifier.fuzzy_contains, kept as the reference."""
+    keyword = keyword.lower()
+    if keyword in text:
+        return True
+    window = len(keyword)
+    for i in range(len(text) - window + 1):
+        if SequenceMatcher(None, text[i:i + window], keyword).ratio() >= threshold:
+            return True
+    return False
+
+
+def add_noise(text: str, rate: float, rng: random.Random) -> str:
+    alphabet = sorted(set(text))
+    out = []
+    for c in text:
+        r = rng.random()
+        if r < rate / 2:
+            continue  # dropped
+        out.append(rng.choice(alphabet) if r < rate else c)
+    return "".join(out)
+
+
+def load_texts(lengths: list, noise: float, limit: int) -> list:
+    docs = sorted((ARTIFACTS_DIR / "docx").glob("*.docx"))[:limit]
+    corpus = ["\n".join(docx_lines(d)).lower() for d in docs]
+    rng = random.Random(0)
+    texts = []
+    for length in lengths:
+        for doc in corpus:
+            text = (doc * (length // max(1, len(doc)) + 1))[:length]
+            texts.append((length, "clean", text))
+            texts.append((length, "noisy", add_noise(text, noise, rng)))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[500, 3000, 10000])
+    parser.add_argument("--noise", type=float, default=0.1, help="share of characters changed")
+    parser.add_argument("--limit", type=int, default=10, help="source documents")
+    args = parser.parse_args()
+
+    keywords = [kw for kws in KEYWORDS.values() for kw in kws]
+    texts = load_texts(args.lengths, args.noise, args.limit)
+    print(f"📄 {len(texts)} texts, {len(keywords)} keywords")
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(keywords, FUZZY_THRESHOLD)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    results = []
+    for length in args.lengths:
+        for kind in ("clean", "noisy"):
+            group = [t for n, k, t in texts if n == length and k == kind]
+            start = time.perf_counter()
+            expected = [
+                {kw.lower() for kw in keywords if sliding_fuzzy_contains(t, kw)} for t in group
+            ]
+            sliding = time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = [matcher.find(t) for t in group]
+            indexed = time.perf_counter() - start
+
+            mismatches = sum(a != b for a, b in zip(expected, found))
+            r = {
+                "length": length,
+                "text": kind,
+                "documents": len(group),
+                "sliding_ms_per_doc": round(sliding / len(group) * 1000, 2),
+                "indexed_ms_per_doc": round(indexed / len(group) * 1000, 2),
+                "speedup": round(sliding / indexed, 1),
+                "mismatches": mismatches,
+            }
+            results.append(r)
+            print(
+                f"{length:>6} {kind:<6} sliding {r['sliding_ms_per_doc']:>8.2f} ms  "
+                f"indexed {r['indexed_ms_per_doc']:>6.2f} ms  x{r['speedup']:<6} "
+                f"mismatches={mismatches}"
+            )
+
+    OUTPUT_PATH.parent.mkdir(exist_ok=True)
+    OUTPUT_PATH.write_text(json.dumps({
+        "time": datetime.now().isoformat(),
+        "threshold": FUZZY_THRESHOLD,
+        "keyword_count": len(keywords),
+        "compile_ms": round(compile_ms, 2),
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📄 Results saved to: {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Sweep OCR worker processes x ONNX intra-op threads on the sample corpus.
+
+    python bench_ocr_backend.py [--workers 1 2 4] [--threads 1 2 4] [--rounds 2]
+
+Each configuration gets its own process pool (see
+src.ocr_engine.make_process_backend); pages are OCR'd from memory, with
+PDF text layers dropped so every page really goes through OCR. The OCR
+cache and daemon are off, also in the spawned workers (which re-read the
+environment), so every round measures the engine. Results are printed and
+written to outputs/ocr_backend_benchmark.json.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+# before src.ocr_engine is imported, here and in the spawned workers
+os.environ["OCR_CACHE_PATH"] = ""
+os.environ["OCR_DAEMON_SOCKET"] = ""
+
+from src import ocr_engine
+from src.ocr_engine import make_process_backend, run_ocr
+from src.pre_processor import iter_preprocess, make_thumbnail
+
+RAW_DIR = Path("data/raw")
+OUTPUT_PATH = Path("outputs/ocr_backend_benchmark.json")
+
+
+def load_pages(raw_dir: Path) -> list:
+    pages = []
+    for _, doc in iter_preprocess(sorted(raw_dir.iterdir()), None, in_memory=True):
+        for page in doc:
+            page.text_layer = None
+            pages.append(make_thumbnail(page))
+    return pages
+
+
+def bench(pages: list, workers: int, threads: int, rounds: int) -> dict:
+    with make_process_backend(workers, threads) as pool:
+        # load the engine in every worker before timing
+        list(pool.map(run_ocr, pages[:workers]))
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            list(pool.map(run_ocr, pages))
+        elapsed = time.perf_counter() - start
+
+    pages_per_sec = len(pages) * rounds / elapsed
+    return {
+        "workers": workers,
+        "intra_op_threads": threads,
+        "seconds": round(elapsed, 2),
+        "pages_per_sec": round(pages_per_sec, 2),
+        "pages_per_sec_per_core": round(pages_per_sec / (workers * threads), 3),
+    }
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    args = parser.parse_args()
+    ocr_engine._daemon = ocr_engine.DaemonClient("")
+
+    pages = load_pages(args.raw_dir)
+    print(f"📄 {len(pages)} pages, {cpus} cores")
+
+    results = []
+    for workers in args.workers:
+        for threads in args.threads:
+            if workers * threads > cpus:
+                continue
+            r = bench(pages, workers, threads, args.rounds)
+            results.append(r)
+            print(
+                f"workers={workers:<3} threads={threads:<2} "
+                f"{r['pages_per_sec']:>7.2f} pages/s  "
+                f"{r['pages_per_sec_per_core']:>6.3f} pages/s/core"
+            )
+
+    OUTPUT_PATH.parent.mkdir(exist_ok=True)
+    OUTPUT_PATH.write_text(json.dumps({
+        "time": datetime.now().isoformat(),
+        "cpu_count": cpus,
+        "page_count": len(pages),
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📄 Results saved to: {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Compare OCR profiles (src.ocr_engine.ENGINE_CONFIGS) for speed and accuracy
+on the synthetic itineraries.
+
+    python bench_ocr_profiles.py [--profiles default small_det int8] [--limit 20]
+    python bench_ocr_profiles.py --quantize   # build the INT8 models first
+
+Pages come from generate_trips/artifacts/images and are OCR'd at the
+classification thumbnail size; the reference text is the paragraph text
+of the .docx each image was rendered from. Per profile this reports pages/s,
+character recall/precision (bag of characters, whitespace ignored), the
+share of reference lines found verbatim, and rule_classify accuracy
+(every document is an itinerary). Results are written to
+outputs/ocr_profile_benchmark.json.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from src import ocr_engine
+from src.artifacts import ARTIFACTS_DIR, docx_lines
+from src.ocr_engine import ENGINE_CONFIGS, OCR_MODEL_DIR, get_ocr, run_ocr
+from src.pre_processor import iter_preprocess, make_thumbnail
+from src.rulebased_classifier import rule_classify
+
+OUTPUT_PATH = Path("outputs/ocr_profile_benchmark.json")
+PAGE_SUFFIX = re.compile(r"_page_(\d+)$")
+
+
+def quantize_models():
+    """Dynamic INT8 quantization of the RapidOCR det/rec models into OCR_MODEL_DIR."""
+    import rapidocr_onnxruntime
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    src_dir = Path(rapidocr_onnxruntime.__file__).parent / "models"
+    OCR_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    for name in ("ch_PP-OCRv4_det_infer", "ch_PP-OCRv4_rec_infer"):
+        dst = OCR_MODEL_DIR / f"{name}.int8.onnx"
+        quantize_dynamic(str(src_dir / f"{name}.onnx"), str(dst), weight_type=QuantType.QUInt8)
+        print(f"🔧 {dst}")
+
+
+def load_docs(artifacts_dir: Path, limit: int) -> list:
+    """[(doc id, [pages]), ...] with pages as classification thumbnails."""
+    images = sorted((artifacts_dir / "images").glob("*.jpg"))
+    done = dict(iter_preprocess(images, None, in_memory=True))
+
+    docs = {}
+    for image in images:
+        match = PAGE_SUFFIX.search(image.stem)
+        doc_id = image.stem[:match.start()] if match else image.stem
+        page_no = int(match.group(1)) if match else 1
+        docs.setdefault(doc_id, []).append((page_no, make_thumbnail(done[image][0])))
+
+    return [
+        (doc_id, [page for _, page in sorted(pages, key=lambda p: p[0])])
+        for doc_id, pages in sorted(docs.items())
+    ][:limit or None]
+
+
+def _squash(text: str) -> str:
+    return re.sub(r"\s+", "", text)
+
+
+def score(text: str, reference: list) -> dict:
+    hyp, ref = Counter(_squash(text)), Counter(_squash("".join(reference)))
+    common = sum((hyp & ref).values())
+    squashed = _squash(text)
+    return {
+        "char_recall": common / max(1, sum(ref.values())),
+        "char_precision": common / max(1, sum(hyp.values())),
+        "line_recall": sum(_squash(line) in squashed for line in reference) / max(1, len(reference)),
+    }
+
+
+def bench(profile: str, docs: list, references: dict) -> dict:
+    get_ocr(profile)
+    run_ocr(docs[0][1][0], profile)  # warm up
+
+    page_count = sum(len(pages) for _, pages in docs)
+    start = time.perf_counter()
+    texts = {
+        doc_id: "\n".join(run_ocr(page, profile).text for page in pages)
+        for doc_id, pages in docs
+    }
+    elapsed = time.perf_counter() - start
+
+    scores = [score(texts[doc_id], references[doc_id]) for doc_id, _ in docs]
+    types = [asyncio.run(rule_classify(texts[doc_id])) for doc_id, _ in docs]
+    return {
+        "profile": profile,
+        "seconds": round(elapsed, 2),
+        "pages_per_sec": round(page_count / elapsed, 3),
+        **{
+            key: round(sum(s[key] for s in scores) / len(scores), 4)
+            for key in ("char_recall", "char_precision", "line_recall")
+        },
+        "classification_accuracy": round(types.count("itinerary") / len(types), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", nargs="+", default=list(ENGINE_CONFIGS))
+    parser.add_argument("--limit", type=int, default=0, help="documents to use (0: all)")
+    parser.add_argument("--artifacts-dir", type=Path, default=ARTIFACTS_DIR)
+    parser.add_argument("--quantize", action="store_true", help="build the INT8 models first")
+    args = parser.parse_args()
+
+    if args.quantize:
+        quantize_models()
+
+    # measure the models themselves: no cached results, no daemon
+    ocr_engine.OCR_CACHE_PATH = ""
+    ocr_engine._daemon = ocr_engine.DaemonClient("")
+
+    docs = load_docs(args.artifacts_dir, args.limit)
+    references = {doc_id: docx_lines(args.artifacts_dir / "docx" / f"{doc_id}.docx") for doc_id, _ in docs}
+    print(f"📄 {len(docs)} documents, {sum(len(p) for _, p in docs)} pages")
+
+    results = []
+    for profile in args.profiles:
+        try:
+            r = bench(profile, docs, references)
+        except ValueError as e:
+            print(f"[WARNING] skipping {profile}: {e}")
+            continue
+        results.append(r)
+        print(
+            f"{profile:<16} {r['pages_per_sec']:>6.2f} pages/s  "
+            f"chars R={r['char_recall']:.3f} P={r['char_precision']:.3f}  "
+            f"lines={r['line_recall']:.3f}  cls={r['classification_accuracy']:.2f}"
+        )
+
+    OUTPUT_PATH.parent.mkdir(exist_ok=True)
+    OUTPUT_PATH.write_text(json.dumps({
+        "time": datetime.now().isoformat(),
+        "document_count": len(docs),
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📄 Results saved to: {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Regression check for near-duplicate detection (src.dedup.find_duplicates).
+
+    python check_dedup.py [--artifacts-dir generate_trips/artifacts] [--raw-dir data/raw] [--limit 0]
+
+Originals: every synthetic itinerary in <artifacts-dir>/images
+(<name>_page_<n>.jpg files are the pages of one) and every file in
+<raw-dir>. All are distinct documents, even where two itineraries were
+rendered from the same template or two hotel folios share hotel and amount,
+so none may be merged. Copies appended after them must each be found as a
+duplicate of their original:
+  - itineraries: a JPEG re-save (quality 50, same size);
+  - PDFs: a screenshot (downscaled, cropped, JPEG, no text layer);
+  - images: two simulated re-shot photos (rotation, crop, scale, exposure),
+    which must also match each other without the original.
+Copies of raw files are OCR'd, so the first run takes a few minutes.
+Exits 1 on any mistake.
+"""
+import argparse
+import io
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from src.artifacts import ARTIFACTS_DIR
+from src.dedup import find_duplicates
+from src.pre_processor import ProcessedImage, iter_preprocess
+
+COPY_QUALITY = 50
+SHOT_QUALITY = 85
+SHOT_SCALE = 0.62   # a page rendered at print resolution, seen on screen
+SHOT_CROP = 0.02
+PHOTO_MAX_ROTATION = 2.0
+PHOTO_MAX_CROP = 0.04
+PHOTO_SCALE = (0.8, 1.2)
+PHOTO_EXPOSURE = (0.85, 1.15)
+PAGE_SUFFIX = re.compile(r"_page_\d+$")
+
+
+def _jpeg_page(name: str, img: Image.Image, quality: int) -> ProcessedImage:
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG", quality=quality)
+    data = buf.getvalue()
+    array = np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+    return ProcessedImage(name=name, array=array, data=data)
+
+
+def resaved(path: Path) -> ProcessedImage:
+    return _jpeg_page(f"{path.stem}_copy", Image.open(path), COPY_QUALITY)
+
+
+def screenshot(page: ProcessedImage) -> ProcessedImage:
+    img = Image.fromarray(page.array)
+    img = img.resize((int(img.width * SHOT_SCALE), int(img.height * SHOT_SCALE)), Image.LANCZOS)
+    m = int(SHOT_CROP * img.width)
+    return _jpeg_page(f"{page.name}_shot", img.crop((m, m, img.width - m, img.height - m)), SHOT_QUALITY)
+
+
+def photo(page: ProcessedImage, rng: np.random.Generator, tag: str) -> ProcessedImage:
+    img = Image.fromarray(page.array)
+    img = img.rotate(
+        rng.uniform(-PHOTO_MAX_ROTATION, PHOTO_MAX_ROTATION),
+        resample=Image.BICUBIC, expand=True, fillcolor=(200, 200, 200),
+    )
+    w, h = img.size
+    crop = [rng.uniform(0, PHOTO_MAX_CROP) for _ in range(4)]
+    img = img.crop((int(crop[0] * w), int(crop[1] * h), w - int(crop[2] * w), h - int(crop[3] * h)))
+    scale = rng.uniform(*PHOTO_SCALE)
+    img = img.resize((int(img.width * scale), int(img.height * scale)), Image.BILINEAR)
+    img = ImageEnhance.Brightness(img).enhance(rng.uniform(*PHOTO_EXPOSURE))
+    img = ImageEnhance.Contrast(img).enhance(rng.uniform(*PHOTO_EXPOSURE))
+    return _jpeg_page(f"{page.name}_{tag}", img, SHOT_QUALITY)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--artifacts-dir", type=Path, default=ARTIFACTS_DIR)
+    parser.add_argument("--raw-dir", type=Path, default=Path("data/raw"))
+    parser.add_argument("--limit", type=int, default=0, help="itineraries to check (0: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    grouped = defaultdict(list)
+    for f in sorted((args.artifacts_dir / "images").glob("*.jpg")):
+        grouped[PAGE_SUFFIX.sub("", f.stem)].append(f)
+    synthetic = sorted(grouped)[:args.limit or None]
+    files = [f for name in synthetic for f in grouped[name]]
+    raw_files = sorted(f for f in args.raw_dir.iterdir() if f.suffix.lower() in (".pdf", ".jpg", ".jpeg", ".png"))
+    pages = dict(iter_preprocess(files + raw_files, None, in_memory=True))
+
+    names = synthetic + [f.name for f in raw_files]
+    originals = [[page for f in grouped[name] for page in pages[f]] for name in synthetic]
+    originals += [pages[f] for f in raw_files]
+    copies, copy_of, photo_pairs = [], [], []
+    for i, name in enumerate(synthetic):
+        copies.append([resaved(f) for f in grouped[name]])
+        copy_of.append(i)
+    for i, f in enumerate(raw_files, start=len(synthetic)):
+        if f.suffix.lower() == ".pdf":
+            copies.append([screenshot(p) for p in pages[f]])
+            copy_of.append(i)
+        else:
+            pair = [[photo(p, rng, tag) for p in pages[f]] for tag in ("photo1", "photo2")]
+            copies += pair
+            copy_of += [i, i]
+            photo_pairs.append((i, pair))
+    print(f"📄 {len(names)} distinct documents + {len(copies)} copies")
+
+    duplicate_of = find_duplicates(originals + copies)
+    errors = 0
+    for i, dup in enumerate(duplicate_of[:len(names)]):
+        if dup is not None:
+            print(f"❌ {names[i]} merged into {names[dup]}")
+            errors += 1
+    labels = names + [copy[0].name for copy in copies]
+    for copy, i, dup in zip(copies, copy_of, duplicate_of[len(names):]):
+        if dup != i:
+            found = labels[dup] if dup is not None else None
+            print(f"❌ {copy[0].name} not matched to {names[i]} (got {found})")
+            errors += 1
+    for i, pair in photo_pairs:
+        if find_duplicates(pair) != [None, 0]:
+            print(f"❌ two photos of {names[i]} not matched to each other")
+            errors += 1
+
+    print(f"{'❌' if errors else '✅'} {errors} mistakes")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,26 @@ import json
 from datetime import datetime
 import time
 
-from src.pre_processor import preprocess_file
+from src.pre_processor import (
+    iter_preprocess,
+    make_thumbnail,
+    needs_tiling,
+    resize_for_extraction,
+    select_tiles,
+)
+from src.preprocess_cache import PreprocessCache
+from src.dedup import find_duplicates
+from src.cascade_classifier import CascadeClassifier
+from src.ngram_classifier import load_ngram_classifier
+from src.template_index import TemplateIndex, vendor_of
+from src.layout import check_trip_amounts, trip_rows
+from src.orientation import fix_orientation
+from src.ocr_engine import get_ocr_cache, ocr_first_regions, run_ocr_batch_async, warm_up
 from src.run_model import run_one_file
 from src.rulebased_classifier import (
     run_ocr_async,
-    rule_classify,
+    rule_classify_batch,
+    rule_classify_regions,
 )
 
 RAW_DIR = Path("data/raw")
@@ -16,6 +31,30 @@ PROCESSED_DIR = Path("data/processed")
 PROMPT_DIR = Path("prompts")
 OUTPUT_DIR = Path("outputs")
 
+# keep pages in memory; set True to also write JPG copies to PROCESSED_DIR
+SAVE_PROCESSED = False
+
+# OCR all thumbnails with one pooled recognition pass instead of per image
+BATCHED_OCR = True
+
+# classify from the top of each document and stop once confident; the
+# full-page OCR then only runs where extraction needs it (tile selection).
+# With BATCHED_OCR the first header band of every document is OCR'd in one
+# pooled pass; further bands are read per document as needed.
+EARLY_EXIT_CLASSIFY = True
+
+# send documents the keyword rules are unsure about to the n-gram model
+# (if trained: train_ngram_classifier.py) and then the LLM classifier
+# (thresholds: CASCADE_MIN_MARGIN / CASCADE_ESCALATE_OTHER / NGRAM_MIN_PROB)
+CASCADE_CLASSIFY = True
+
+# look documents up by header layout (known vendor templates) before
+# keyword scoring; learnt from confidently classified documents
+TEMPLATE_CLASSIFY = True
+
+# rotate sideways / upside-down scans and photos upright before OCR
+FIX_ORIENTATION = True
+
 PROMPT_MAP = {
     "itinerary": PROMPT_DIR / "itinerary_prompt.txt",
     "hotel_invoice": PROMPT_DIR / "hotel_prompt.txt",
@@ -23,27 +62,93 @@ PROMPT_MAP = {
     "other": PROMPT_DIR / "other_prompt.txt",
 }
 
-async def batch_ocr_and_classify(paths):
-    # ---- Batch OCR ----
-    ocr_tasks = [run_ocr_async(p) for p in paths]
-    texts = await asyncio.gather(*ocr_tasks)
+async def batch_ocr_and_classify(docs, templates=None):
+    """
+    `docs` is a list of documents, each a list of pages (paths or ProcessedImage).
+    `templates` (a TemplateIndex) is used by header-first classification.
+
+    Each item's "text" is what the later stages (classifier cascade, n-gram
+    model) receive: the OCR text of all thumbnails, or with
+    EARLY_EXIT_CLASSIFY the text read until the rules were confident. A
+    document stops early only with a keyword margin of EARLY_EXIT_MARGIN,
+    which (at the default CASCADE_MIN_MARGIN) is never escalated, so
+    escalated documents are read to the end; template matches keep only
+    the first band's text.
+    """
+    # ---- Header-first classification (stops OCR early per document) ----
+    if EARLY_EXIT_CLASSIFY:
+        thumbs = [[make_thumbnail(p) for p in pages] for pages in docs]
+        first = await ocr_first_regions(thumbs) if BATCHED_OCR else [None] * len(docs)
+        classified = await asyncio.gather(*[
+            rule_classify_regions(t, templates, f) for t, f in zip(thumbs, first)
+        ])
+        return [
+            {
+                "file": str(pages[0]), "path": pages[0], "pages": pages, "text": c.text,
+                "type": c.type, "scores": c.scores, "vendor": c.vendor,
+                "rule_seconds": c.rule_seconds,
+            }
+            for pages, c in zip(docs, classified)
+        ]
+
+    # ---- Batch OCR (all pages of all documents, on thumbnails) ----
+    all_pages = [p for pages in docs for p in pages]
+    thumbs = [make_thumbnail(p) for p in all_pages]
+    if BATCHED_OCR:
+        page_texts = iter(await run_ocr_batch_async(thumbs))
+    else:
+        page_texts = iter(await asyncio.gather(*[run_ocr_async(t) for t in thumbs]))
+
+    # tiled pages: keep the per-tile text for tile selection at extraction
+    for page, thumb in zip(all_pages, thumbs):
+        if thumb is not page:
+            page.tile_texts = thumb.tile_texts
+    texts = [
+        "\n".join(next(page_texts).text for _ in pages)
+        for pages in docs
+    ]
 
-    # ---- Batch rule-based classification ----
-    cls_tasks = [rule_classify(t) for t in texts]
-    types = await asyncio.gather(*cls_tasks)
+    # ---- Batch rule-based classification (off the event loop) ----
+    start = time.perf_counter()
+    classified = await rule_classify_batch(texts)
+    per_doc = (time.perf_counter() - start) / max(1, len(texts))
 
     return [
-        {"file": str(p), "path": p, "text": t, "type": ty}
-        for p, t, ty in zip(paths, texts, types)
+        {
+            "file": str(pages[0]), "path": pages[0], "pages": pages, "text": t,
+            "type": ty, "scores": s, "vendor": vendor_of(t), "rule_seconds": per_doc,
+        }
+        for pages, t, (ty, s) in zip(docs, texts, classified)
     ]
 
 
-async def extract_one(processed_path: Path, doc_type: str):
+async def extract_one(pages: list, doc_type: str):
     if doc_type not in PROMPT_MAP:
         return None
 
+    processed_path = pages[0]
     prompt_path = PROMPT_MAP[doc_type]
-    result = await run_one_file(processed_path, prompt_path)
+
+    # header-first classification skipped the full-page OCR of tall pages
+    for p in pages:
+        if needs_tiling(p) and p.tile_texts is None:
+            thumb = make_thumbnail(p)
+            await run_ocr_async(thumb)
+            p.tile_texts = thumb.tile_texts
+
+    # itineraries: rebuild the trip table from the OCR boxes (cached from
+    # classification where possible) to check the VLM's trip rows
+    rows = None
+    if doc_type == "itinerary":
+        ocr = await asyncio.gather(*[run_ocr_async(make_thumbnail(p)) for p in pages])
+        rows = [row for r in ocr for row in trip_rows(r)]
+
+    images = [
+        tile
+        for p in pages
+        for tile in select_tiles(resize_for_extraction(p, doc_type))
+    ]
+    result = await run_one_file(images, prompt_path)
 
     # Try parsing JSON
     try:
@@ -53,11 +158,18 @@ async def extract_one(processed_path: Path, doc_type: str):
     except:
         pass
 
-    return {
+    item = {
         "processed_file": processed_path.name,
+        "page_count": len(pages),
         "type": doc_type,
         "result": result
     }
+    if rows is not None:
+        item["ocr_trip_rows"] = rows
+        output = result.get("output")
+        if isinstance(output, dict) and isinstance(output.get("行程"), list):
+            item["trip_row_check"] = check_trip_amounts(output["行程"], rows)
+    return item
 
 
 
@@ -66,11 +178,59 @@ async def main():
 
     # ---- Load and preprocess files ----
     raw_files = sorted(RAW_DIR.iterdir())
-    processed_paths = [preprocess_file(f, PROCESSED_DIR) for f in raw_files]
+    output_dir = PROCESSED_DIR if SAVE_PROCESSED else None
+    cache = PreprocessCache(PROCESSED_DIR / "cache")
+    # pages are held losslessly compressed (release()) and decompressed where
+    # used, so memory stays within iter_preprocess's pixel budget plus the
+    # compressed pages and the decode cache (DECODE_CACHE_PIXELS)
+    loop = asyncio.get_running_loop()
+    done = {}
+    scanned = rotated = 0
+    for file, pages in iter_preprocess(raw_files, output_dir, in_memory=True, cache=cache):
+        for p in pages:
+            # ---- Page orientation (image pages only), while still decoded ----
+            if FIX_ORIENTATION and p.text_layer is None:
+                scanned += 1
+                rotated += bool(await loop.run_in_executor(None, fix_orientation, p))
+            p.release()
+        done[file] = pages
+    processed_docs = [done[f] for f in raw_files if f in done]
+    print(f"🗂 Preprocess cache: {cache.hits} hits, {cache.misses} misses")
+    if FIX_ORIENTATION:
+        print(f"🧭 {rotated} of {scanned} image pages rotated upright")
+
+    # ---- Near-duplicate detection (OCRs hash candidates, so off the loop) ----
+    duplicate_of = await loop.run_in_executor(None, find_duplicates, processed_docs)
+    unique_docs = [d for d, dup in zip(processed_docs, duplicate_of) if dup is None]
+    print(f"🧬 {len(processed_docs) - len(unique_docs)} duplicate documents")
+
+    # ---- Load OCR models only if some page has no text layer ----
+    if any(p.text_layer is None for pages in unique_docs for p in pages):
+        stats = await loop.run_in_executor(None, warm_up)
+        print(f"🔧 OCR engine loaded: {stats}")
 
     # ---- Batch OCR + classification ----
     print("\n🔍 Running batch OCR + classification ...")
-    batch_results = await batch_ocr_and_classify(processed_paths)
+    templates = TemplateIndex() if TEMPLATE_CLASSIFY else None
+    batch_results = await batch_ocr_and_classify(unique_docs, templates)
+    if templates is not None:
+        templates.save()
+        print(f"🧩 Template index: {templates.stats()}")
+    ocr_cache = get_ocr_cache()
+    if ocr_cache is not None:
+        print(f"🗂 OCR cache: {ocr_cache.hits} hits, {ocr_cache.misses} misses")
+
+    # ---- Escalate ambiguous documents to the LLM classifier ----
+    if CASCADE_CLASSIFY:
+        cascade = CascadeClassifier(ngram=load_ngram_classifier())
+        decided = await cascade.classify_batch(
+            [item["text"] for item in batch_results],
+            [(item["type"], item["scores"]) for item in batch_results],
+            [item["rule_seconds"] for item in batch_results],
+        )
+        for item, (doc_type, source) in zip(batch_results, decided):
+            item["type"], item["type_source"] = doc_type, source
+        print(f"🧮 Classifier cascade: {cascade.stats()}")
 
     # ---- Extraction tasks ----
     extract_tasks = []
@@ -78,13 +238,34 @@ async def main():
         doc_type = item["type"]
         if doc_type not in PROMPT_MAP:
             print(f"❌ Unknown type: {doc_type}, skipping {item['file']}")
+            extract_tasks.append(asyncio.sleep(0, result=None))
             continue
-        extract_tasks.append(extract_one(item["path"], doc_type))
+        extract_tasks.append(extract_one(item["pages"], doc_type))
 
     # Run all extraction in parallel
     extracted = await asyncio.gather(*extract_tasks)
-    return [e for e in extracted if e is not None]
+    for item, result in zip(batch_results, extracted):
+        if result is not None and item["vendor"] is not None:
+            result["vendor"] = item["vendor"]
+    extracted = iter(extracted)
+
+    # ---- Duplicates reuse the first document's result ----
+    results = []
+    for pages, dup in zip(processed_docs, duplicate_of):
+        if dup is None:
+            results.append(next(extracted))
+            continue
+        original = results[dup]
+        if original is None:
+            results.append(None)
+            continue
+        results.append({
+            **original,
+            "processed_file": pages[0].name,
+            "duplicate_of": original["processed_file"],
+        })
 
+    return [r for r in results if r is not None]
 
 
 if __name__ == "__main__":
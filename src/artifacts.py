@@ -0,0 +1,15 @@
+import re
+import zipfile
+from pathlib import Path
+
+# synthetic itineraries (generate_trips): docx/ sources and their images/
+# renders, shared by the benchmark, training and check scripts
+ARTIFACTS_DIR = Path("generate_trips/artifacts")
+
+
+def docx_lines(path: Path) -> list:
+    """Non-empty paragraph texts of a .docx, read from its XML (no python-docx)."""
+    xml = zipfile.ZipFile(path).read("word/document.xml").decode("utf-8")
+    paragraphs = re.findall(r"<w:p[ >].*?</w:p>", xml, re.S)
+    lines = ["".join(re.findall(r"<w:t(?:\s[^>]*)?>([^<]*)</w:t>", p)) for p in paragraphs]
+    return [line for line in lines if line.strip()]
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.llm_classifier import API_KEY_ENV, try_classify_llm_async
+from src.ngram_classifier import NgramClassifier
+from src.rulebased_classifier import rule_classify_batch, score_margin
+
+# Rules decide unless the keyword scores are ambiguous: documents whose
+# best type leads the runner-up by fewer than CASCADE_MIN_MARGIN keywords,
+# or that the rules call "other", are escalated.
+CASCADE_MIN_MARGIN = int(os.getenv("CASCADE_MIN_MARGIN", "2"))
+CASCADE_ESCALATE_OTHER = os.getenv("CASCADE_ESCALATE_OTHER", "1") != "0"
+# with an n-gram model, it answers first; only its low-confidence answers
+# go on to the LLM
+NGRAM_MIN_PROB = float(os.getenv("NGRAM_MIN_PROB", "0.8"))
+LATENCY_WINDOW = 1000  # classifications kept for the latency percentiles
+
+
+def _latency_stats(latencies) -> Optional[dict]:
+    if not latencies:
+        return None
+    ms = np.array(latencies) * 1000
+    return {
+        "mean": round(float(ms.mean()), 1),
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p95": round(float(np.percentile(ms, 95)), 1),
+    }
+
+
+class CascadeClassifier:
+    """
+    Rule-based classification with escalation for ambiguous documents:
+    to the n-gram model if one is given, then to the LLM.
+
+    Counts documents, n-gram decisions, escalations, LLM answers that
+    differ from the rules and failed LLM requests, and keeps per-stage
+    latencies (see stats()). Without an API key, or when the LLM request
+    fails, the rule result stands.
+    """
+
+    def __init__(
+        self,
+        min_margin: int = CASCADE_MIN_MARGIN,
+        escalate_other: bool = CASCADE_ESCALATE_OTHER,
+        ngram: Optional[NgramClassifier] = None,
+        ngram_min_prob: float = NGRAM_MIN_PROB,
+    ):
+        self.min_margin = min_margin
+        self.escalate_other = escalate_other
+        self.ngram = ngram
+        self.ngram_min_prob = ngram_min_prob
+        self.documents = 0
+        self.ngram_decided = 0
+        self.escalated = 0
+        self.overridden = 0
+        self.failed = 0  # LLM request failed, rule result kept
+        self.skipped = 0  # ambiguous, but no API key
+        self.rule_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ngram_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.llm_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def is_ambiguous(self, doc_type: str, scores: Optional[Dict[str, int]]) -> bool:
+        if scores is None:  # matched a known template, see src.template_index
+            return False
+        if doc_type == "other":
+            return self.escalate_other
+        return score_margin(scores) < self.min_margin
+
+    async def _escalate(self, text: str, rule_type: str) -> Optional[str]:
+        start = time.perf_counter()
+        doc_type = await try_classify_llm_async(text)
+        self.llm_latencies.append(time.perf_counter() - start)
+        self.escalated += 1
+        if doc_type is None:
+            self.failed += 1
+        else:
+            self.overridden += doc_type != rule_type
+        return doc_type
+
+    async def classify_batch(
+        self,
+        texts: List[str],
+        classified: Optional[List[Tuple[str, Optional[Dict[str, int]]]]] = None,
+        rule_seconds: Optional[List[float]] = None,
+    ) -> List[Tuple[str, str]]:
+        """
+        (type, "template" | "rules" | "ngram" | "llm") per text. `classified`
+        takes (type, scores) already computed by rule_classify_batch /
+        rule_classify_regions, and `rule_seconds` the time that took per
+        text (for the rule latency stats).
+        """
+        if classified is None:
+            start = time.perf_counter()
+            classified = await rule_classify_batch(texts)
+            if texts:
+                per_doc = (time.perf_counter() - start) / len(texts)
+                self.rule_latencies.extend([per_doc] * len(texts))
+        elif rule_seconds is not None:
+            self.rule_latencies.extend(rule_seconds)
+        self.documents += len(texts)
+
+        has_key = bool(os.getenv(API_KEY_ENV))
+        results = [
+            (doc_type, "rules" if scores is not None else "template")
+            for doc_type, scores in classified
+        ]
+        escalate = [
+            i for i, (doc_type, scores) in enumerate(classified)
+            if self.is_ambiguous(doc_type, scores)
+        ]
+        if escalate and self.ngram is not None:
+            start = time.perf_counter()
+            predicted = self.ngram.predict([texts[i] for i in escalate])
+            per_doc = (time.perf_counter() - start) / len(escalate)
+            self.ngram_latencies.extend([per_doc] * len(escalate))
+
+            unsure = []
+            for i, (doc_type, prob) in zip(escalate, predicted):
+                if prob >= self.ngram_min_prob:
+                    results[i] = (doc_type, "ngram")
+                    self.ngram_decided += 1
+                else:
+                    unsure.append(i)
+            escalate = unsure
+
+        if escalate and not has_key:
+            self.skipped += len(escalate)
+            escalate = []
+
+        llm_types = await asyncio.gather(*[
+            self._escalate(texts[i], classified[i][0]) for i in escalate
+        ])
+        for i, doc_type in zip(escalate, llm_types):
+            if doc_type is not None:
+                results[i] = (doc_type, "llm")
+        return results
+
+    async def classify(self, text: str) -> str:
+        return (await self.classify_batch([text]))[0][0]
+
+    def stats(self) -> dict:
+        return {
+            "documents": self.documents,
+            "ngram_decided": self.ngram_decided,
+            "escalated": self.escalated,
+            "escalation_rate": round(self.escalated / self.documents, 3) if self.documents else 0.0,
+            "llm_overrides": self.overridden,
+            "llm_failures": self.failed,
+            "skipped_no_api_key": self.skipped,
+            "rule_latency_ms": _latency_stats(self.rule_latencies),
+            "ngram_latency_ms": _latency_stats(self.ngram_latencies),
+            "llm_latency_ms": _latency_stats(self.llm_latencies),
+        }
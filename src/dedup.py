@@ -0,0 +1,218 @@
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from src.ocr_engine import run_ocr
+from src.pre_processor import ProcessedImage, make_thumbnail
+
+
+# 8x8 pHash of the first page proposes candidates. Re-encodes are at
+# distance <=2, screenshots of a PDF and re-shot photos (rotation, crop,
+# scale, exposure) at 2-16; distinct receipts rendered from the same
+# template (generate_trips/artifacts/images) are often within 16 too, so
+# hashes only propose candidates.
+PHASH_SIZE = 8
+PHASH_DCT_SIZE = 32
+PHASH_MAX_DISTANCE = 16
+
+# Content check on candidates, cheapest first:
+# - two text-layer pages: same text;
+# - same-size pages: at most CONTENT_MAX_DIFF of their pixels differ by more
+#   than CONTENT_DIFF_LEVEL grey levels (a JPEG q50 re-save changes <0.03%,
+#   a same-template receipt with other dates and amounts >0.2%);
+# - anything else: OCR of both classification thumbnails (text layers
+#   ignored, so a PDF and its screenshot are read the same way), compared as
+#   multisets of digit trigrams taken per line (immune to line order and to
+#   "2024-03-04" vs "20240304") and of character bigrams. On data/raw,
+#   simulated screenshots and re-shot photos score >=0.74 on digits and
+#   >=0.66 on bigrams; the closest distinct pair, two folios of one hotel
+#   with the same amount, scores 0.60 on digits (bigrams do not separate
+#   it, 0.88). Pages with fewer than CONTENT_MIN_DIGITS digits are never
+#   merged this way.
+CONTENT_DIFF_LEVEL = 64
+CONTENT_MAX_DIFF = 0.001
+CONTENT_MIN_DIGIT_SIMILARITY = 0.68
+CONTENT_MIN_TEXT_SIMILARITY = 0.5
+CONTENT_MIN_DIGITS = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    x = np.arange(n)
+    m = np.cos(np.pi * (2 * x[None, :] + 1) * x[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = _dct_matrix(PHASH_DCT_SIZE)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _gray(page: Union[Path, ProcessedImage]) -> Image.Image:
+    if isinstance(page, ProcessedImage):
+        return Image.fromarray(page.array).convert("L")
+    return Image.open(page).convert("L")
+
+
+def phash(gray: Image.Image) -> int:
+    """Perceptual hash: low-frequency DCT coefficients above their median."""
+    small = np.asarray(
+        gray.resize((PHASH_DCT_SIZE, PHASH_DCT_SIZE), Image.BILINEAR), dtype=np.float64
+    )
+    low = (_DCT @ small @ _DCT.T)[:PHASH_SIZE, :PHASH_SIZE].ravel()
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def _text_of(page: Union[Path, ProcessedImage]) -> Optional[str]:
+    if isinstance(page, ProcessedImage) and page.text_layer is not None:
+        return "".join(page.text_layer.text.split())
+    return None
+
+
+def _ocr_text(page: Union[Path, ProcessedImage]) -> str:
+    """OCR text of the classification thumbnail, ignoring any text layer."""
+    thumb = make_thumbnail(page)
+    if isinstance(thumb, ProcessedImage):
+        thumb = ProcessedImage(name=thumb.name, array=thumb.array, data=b"")
+    return run_ocr(thumb).text
+
+
+def _dice(a: Counter, b: Counter) -> float:
+    total = sum(a.values()) + sum(b.values())
+    return 2 * sum((a & b).values()) / total if total else 0.0
+
+
+def _bigrams(text: str) -> Counter:
+    text = "".join(text.lower().split())
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _digit_trigrams(text: str) -> Counter:
+    runs = [re.sub(r"\D", "", line) for line in text.splitlines()]
+    return Counter(r[i:i + 3] for r in runs if r for i in range(max(1, len(r) - 2)))
+
+
+def same_text(a: str, b: str) -> bool:
+    """Whether two OCR texts read as the same document (see CONTENT_MIN_*)."""
+    if min(len(re.sub(r"\D", "", a)), len(re.sub(r"\D", "", b))) < CONTENT_MIN_DIGITS:
+        return False
+    return (
+        _dice(_digit_trigrams(a), _digit_trigrams(b)) >= CONTENT_MIN_DIGIT_SIMILARITY
+        and _dice(_bigrams(a), _bigrams(b)) >= CONTENT_MIN_TEXT_SIMILARITY
+    )
+
+
+def same_content(
+    a: Union[Path, ProcessedImage],
+    b: Union[Path, ProcessedImage],
+    texts: Optional[Dict[int, str]] = None,
+) -> bool:
+    """
+    Whether two pages hold the same content, not just the same layout.
+    `texts` caches OCR text by id(page) across calls.
+    """
+    text_a, text_b = _text_of(a), _text_of(b)
+    if text_a is not None and text_b is not None:
+        return text_a == text_b
+
+    gray_a, gray_b = _gray(a), _gray(b)
+    if gray_a.size == gray_b.size:
+        diff = np.abs(np.asarray(gray_a, dtype=np.int16) - np.asarray(gray_b, dtype=np.int16))
+        if float((diff > CONTENT_DIFF_LEVEL).mean()) <= CONTENT_MAX_DIFF:
+            return True
+
+    texts = {} if texts is None else texts
+    for page in (a, b):
+        if id(page) not in texts:
+            texts[id(page)] = _ocr_text(page)
+    return same_text(texts[id(a)], texts[id(b)])
+
+
+def page_hash(page: Union[Path, ProcessedImage]) -> int:
+    return phash(_gray(page))
+
+
+class HashIndex:
+    """
+    Near-duplicate index over fixed-width hashes (multi-index hashing).
+
+    Hashes are split into max_distance + 1 bands; by pigeonhole, any hash
+    within max_distance of a stored one matches it exactly on at least one
+    band, so only those candidates are compared bit by bit.
+    """
+
+    def __init__(self, bits: int = PHASH_SIZE * PHASH_SIZE, max_distance: int = PHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        edges = np.linspace(0, bits, max_distance + 2).astype(int)
+        self.bands = [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])]
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in self.bands]
+        self.hashes: List[int] = []
+
+    def add(self, h: int) -> int:
+        """Store a hash and return its id."""
+        idx = len(self.hashes)
+        self.hashes.append(h)
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            table.setdefault((h >> shift) & mask, []).append(idx)
+        return idx
+
+    def query(self, h: int) -> List[Tuple[int, int]]:
+        """Return (id, distance) of stored hashes within max_distance, nearest first."""
+        candidates: Set[int] = set()
+        for table, (shift, mask) in zip(self.tables, self.bands):
+            candidates.update(table.get((h >> shift) & mask, ()))
+
+        matches = [(i, hamming(h, self.hashes[i])) for i in candidates]
+        return sorted(
+            [(i, d) for i, d in matches if d <= self.max_distance],
+            key=lambda m: m[1],
+        )
+
+
+def find_duplicates(docs: Sequence[Sequence[Union[Path, ProcessedImage]]]) -> List[Optional[int]]:
+    """
+    For each document (a list of pages) return the index of the first
+    earlier document it duplicates, or None.
+
+    Documents are indexed by the pHash of their first page; a candidate is
+    accepted only if it has the same page count, every page pair is within
+    the pHash threshold, and every page pair passes same_content(). Only
+    candidates are OCR'd, through the OCR cache that classification uses.
+    """
+    index = HashIndex()
+    owners: List[int] = []  # index id -> document index
+    hashes: List[List[int]] = []
+    texts: Dict[int, str] = {}
+    duplicate_of: List[Optional[int]] = []
+
+    for doc_idx, pages in enumerate(docs):
+        doc_hashes = [page_hash(p) for p in pages]
+        hashes.append(doc_hashes)
+
+        match = None
+        for hid, _ in index.query(doc_hashes[0]):
+            other = owners[hid]
+            if len(hashes[other]) != len(doc_hashes):
+                continue
+            if all(
+                hamming(h1, h2) <= PHASH_MAX_DISTANCE for h1, h2 in zip(doc_hashes, hashes[other])
+            ) and all(same_content(a, b, texts) for a, b in zip(pages, docs[other])):
+                match = other
+                break
+
+        duplicate_of.append(match)
+        if match is None:
+            index.add(doc_hashes[0])
+            owners.append(doc_idx)
+
+    return duplicate_of
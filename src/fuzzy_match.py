@@ -0,0 +1,68 @@
+from difflib import SequenceMatcher
+from typing import Iterable, Set
+
+import numpy as np
+
+
+class KeywordMatcher:
+    """
+    Fuzzy keyword search over a fixed keyword set, compiled once.
+
+    A keyword matches when it occurs verbatim in the text, or when some
+    window of the text as long as the keyword has a SequenceMatcher ratio
+    of at least `threshold` against it (the fuzzy_contains semantics).
+
+    Matching characters in SequenceMatcher pair up one to one, so a window
+    can only reach the threshold if its character multiset shares at least
+    threshold * len(keyword) characters with the keyword's. That bound is
+    computed for every window of every keyword at once from prefix counts
+    of the keyword alphabet; SequenceMatcher only runs on the few windows
+    that pass it, so results are identical to the full sliding window.
+    """
+
+    def __init__(self, keywords: Iterable[str], threshold: float = 0.75):
+        self.keywords = list(dict.fromkeys(kw.lower() for kw in keywords))
+        self.threshold = threshold
+
+        alphabet = sorted({c for kw in self.keywords for c in kw})
+        self._column = {c: i for i, c in enumerate(alphabet)}
+        # per keyword: alphabet columns of its distinct characters and their counts
+        self._profiles = []
+        for kw in self.keywords:
+            chars = sorted(set(kw))
+            self._profiles.append((
+                np.array([self._column[c] for c in chars], dtype=np.intp),
+                np.array([kw.count(c) for c in chars], dtype=np.int32),
+            ))
+
+    def _prefix_counts(self, text: str) -> np.ndarray:
+        """(len(text) + 1, alphabet) running counts of each keyword character."""
+        codes = np.fromiter(
+            (self._column.get(c, -1) for c in text), dtype=np.intp, count=len(text)
+        )
+        hits = np.zeros((len(text) + 1, len(self._column)), dtype=np.int32)
+        pos = np.flatnonzero(codes >= 0)
+        hits[pos + 1, codes[pos]] = 1
+        return np.cumsum(hits, axis=0, out=hits)
+
+    def find(self, text: str) -> Set[str]:
+        """Keywords (lower-cased) found in `text`; the text is matched as given."""
+        found = {kw for kw in self.keywords if kw in text}
+        pending = [
+            (kw, profile) for kw, profile in zip(self.keywords, self._profiles)
+            if kw not in found and len(kw) <= len(text)
+        ]
+        if not pending:
+            return found
+
+        prefix = self._prefix_counts(text)
+        for kw, (columns, counts) in pending:
+            m = len(kw)
+            window = prefix[m:, columns] - prefix[:-m, columns]
+            shared = np.minimum(window, counts).sum(axis=1)
+            # same float expression as SequenceMatcher.ratio() for equal lengths
+            for i in np.flatnonzero(2.0 * shared / (2 * m) >= self.threshold):
+                if SequenceMatcher(None, text[i:i + m], kw).ratio() >= self.threshold:
+                    found.add(kw)
+                    break
+        return found
@@ -0,0 +1,177 @@
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.ocr_engine import OcrResult
+
+
+# Boxes are on the same row when the middle ROW_CORE of their heights
+# overlap; this tolerates slanted lines without merging adjacent rows.
+ROW_CORE = 0.5
+
+# trip table columns, matched against header cells in this order
+# (the first field whose keyword is in the header text wins)
+TRIP_COLUMNS = [
+    ("route", ("起点/终点",)),
+    ("start_time", ("用车时间", "上车时间", "出发时间")),
+    ("city", ("城市",)),
+    ("origin", ("起点", "上车地点")),
+    ("destination", ("终点", "下车地点")),
+    ("distance_km", ("里程",)),
+    ("car_type", ("车型",)),
+    ("amount", ("金额",)),
+]
+MIN_HEADER_COLUMNS = 3
+# the table ends at a vertical gap wider than MAX_ROW_GAP times the
+# header-to-first-row pitch, or at a closing line such as "以上为行程明细"
+MAX_ROW_GAP = 2.0
+TABLE_END_PATTERN = re.compile(r"^以上")
+AMOUNT_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def cluster_intervals(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Label 1-D intervals [lo, hi] so that chains of overlapping intervals
+    share a label; labels are numbered in ascending position.
+    """
+    if len(lo) == 0:
+        return np.zeros(0, dtype=int)
+    order = np.argsort(lo, kind="stable")
+    reach = np.maximum.accumulate(hi[order])
+    starts = np.concatenate([[True], lo[order][1:] > reach[:-1]])
+    labels = np.empty(len(lo), dtype=int)
+    labels[order] = np.cumsum(starts) - 1
+    return labels
+
+
+def group_rows(result: OcrResult) -> List[np.ndarray]:
+    """Box indices per text row, top to bottom, each row sorted left to right."""
+    ys = result.boxes[:, :, 1]
+    y0, y1 = ys.min(axis=1), ys.max(axis=1)
+    margin = (y1 - y0) * (1 - ROW_CORE) / 2
+    labels = cluster_intervals(y0 + margin, y1 - margin)
+
+    x0 = result.boxes[:, :, 0].min(axis=1)
+    return [
+        idx[np.argsort(x0[idx], kind="stable")]
+        for idx in (np.flatnonzero(labels == row) for row in range(labels.max(initial=-1) + 1))
+    ]
+
+
+def _column_field(header: str) -> Optional[str]:
+    for field, keywords in TRIP_COLUMNS:
+        if any(kw in header for kw in keywords):
+            return field
+    return None
+
+
+def _parse_amount(text: str) -> Optional[float]:
+    numbers = AMOUNT_PATTERN.findall(text.replace(",", ""))
+    return float(numbers[-1]) if numbers else None
+
+
+def trip_rows(result: OcrResult) -> List[Dict]:
+    """
+    Rebuild the trip table of an itinerary page from its OCR boxes.
+
+    Rows come from clustering the boxes' y-intervals; the first row with at
+    least MIN_HEADER_COLUMNS known headers is the table header, and the table
+    runs until a wide vertical gap or a closing line (MAX_ROW_GAP,
+    TABLE_END_PATTERN). Columns
+    come from clustering the x-intervals of the table boxes (boxes spanning
+    several header cells are skipped), each labelled with the header cell
+    it overlaps most. A row with a start time opens a trip; rows without
+    one (wrapped cells) are appended to the open trip.
+    Returns one dict per trip with the TRIP_COLUMNS fields found, plus
+    `amount` as a float.
+    """
+    if len(result) == 0:
+        return []
+
+    rows = group_rows(result)
+    x0 = result.boxes[:, :, 0].min(axis=1)
+    x1 = result.boxes[:, :, 0].max(axis=1)
+
+    header_row = None
+    for r, idx in enumerate(rows):
+        fields = [_column_field(result.texts[i]) for i in idx]
+        if len({f for f in fields if f}) >= MIN_HEADER_COLUMNS:
+            header_row = r
+            break
+    if header_row is None:
+        return []
+
+    header = [i for i in rows[header_row] if _column_field(result.texts[i])]
+    y0 = result.boxes[:, :, 1].min(axis=1)
+    y1 = result.boxes[:, :, 1].max(axis=1)
+    bottom = y1[rows[header_row]].max()
+    body_rows = rows[header_row + 1:]
+    if not body_rows:
+        return []
+    pitch = max(float(np.median(y1[header] - y0[header])), y0[body_rows[0]].min() - bottom)
+
+    table = []
+    for idx in body_rows:
+        if y0[idx].min() - bottom > MAX_ROW_GAP * pitch or TABLE_END_PATTERN.match(result.texts[idx[0]]):
+            break
+        table.append(idx)
+        bottom = max(bottom, y1[idx].max())
+    if not table:
+        return []
+    body = np.concatenate(table)
+
+    # boxes covering most of two or more header cells (notes, totals)
+    # would chain all columns together; leave them out
+    hx0, hx1 = x0[header], x1[header]
+    overlap = np.minimum(x1[body, None], hx1) - np.maximum(x0[body, None], hx0)
+    body = body[(overlap > (hx1 - hx0) / 2).sum(axis=1) < 2]
+    if len(body) == 0:
+        return []
+
+    # label each body column with the header cell it overlaps most
+    col_of = cluster_intervals(x0[body], x1[body])
+    field_of_col = {}
+    for col in range(col_of.max() + 1):
+        members = body[col_of == col]
+        lo, hi = x0[members].min(), x1[members].max()
+        overlap = [min(hi, x1[h]) - max(lo, x0[h]) for h in header]
+        best = int(np.argmax(overlap))
+        if overlap[best] > 0:
+            field_of_col[col] = _column_field(result.texts[header[best]])
+    field_of_box = {int(b): field_of_col.get(int(c)) for b, c in zip(body, col_of)}
+
+    trips: List[Dict[str, List[str]]] = []
+    for idx in table:
+        cells: Dict[str, List[str]] = {}
+        for i in idx:
+            field = field_of_box.get(int(i))
+            if field:
+                cells.setdefault(field, []).append(result.texts[i])
+        if "start_time" in cells:
+            trips.append(cells)
+        elif trips:
+            for field, texts in cells.items():
+                trips[-1].setdefault(field, []).extend(texts)
+
+    out = []
+    for cells in trips:
+        trip = {field: " ".join(texts) for field, texts in cells.items()}
+        trip["amount"] = _parse_amount(trip["amount"]) if "amount" in trip else None
+        out.append(trip)
+    return out
+
+
+def check_trip_amounts(trips: list, rows: List[Dict], amount_key: str = "金额") -> Dict:
+    """
+    Compare extracted trips with the OCR table rows: trip count and the
+    multiset of amounts (order-independent, to the cent).
+    """
+    amounts = [_parse_amount(str(t.get(amount_key))) for t in trips if isinstance(t, dict)]
+    extracted = sorted(round(a, 2) for a in amounts if a is not None)
+    found = sorted(round(r["amount"], 2) for r in rows if r.get("amount") is not None)
+    return {
+        "ocr_rows": len(rows),
+        "extracted_rows": len(trips),
+        "amounts_match": extracted == found,
+    }
@@ -1,9 +1,10 @@
 from pathlib import Path
+from typing import Optional
 import os
 import asyncio
 import httpx
-from concurrent.futures import ThreadPoolExecutor
-from rapidocr_onnxruntime import RapidOCR
+
+from src.ocr_engine import run_ocr_async
 
 
 BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
@@ -13,25 +14,9 @@ MODEL_NAME = "qwen2.5-7b-instruct"
 # Limit concurrency to 3 for classification (DashScope safe limit)
 SEM_CLASSIFY = asyncio.Semaphore(3)
 
-# OCR executor
-ocr = RapidOCR()
-ocr_executor = ThreadPoolExecutor(max_workers=8)
-
-
-def run_ocr(path: Path) -> str:
-    result, _ = ocr(str(path))
-    if result:
-        return "\n".join([line[1] for line in result])
-    return ""
-
-# wrap the synchronous inside a thread
-# returun oct result asynchronously
-async def run_ocr_async(path: Path) -> str:
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(ocr_executor, run_ocr, path)
-
 
-async def classify_llm_async(text: str) -> str:
+async def try_classify_llm_async(text: str) -> Optional[str]:
+    """The LLM's document type, or None if the request failed after retries."""
     if len(text.strip()) < 5:
         return "other"
 
@@ -72,7 +57,7 @@ OCR 文本：
                     break
             except Exception as e:
                 if attempt == 2:
-                    return "other"
+                    return None
                 await asyncio.sleep(1)
 
     if "行程" in answer:
@@ -85,11 +70,16 @@ OCR 文本：
     return "other"
 
 
+async def classify_llm_async(text: str) -> str:
+    """Like try_classify_llm_async, with a failed request read as "other"."""
+    return await try_classify_llm_async(text) or "other"
+
+
 async def classification(image_path: Path) -> dict:
     print(f"\n📄 分类文件: {image_path.name}")
 
-    text = await run_ocr_async(image_path)
-    doc_type = await classify_llm_async(text)
+    ocr = await run_ocr_async(image_path)
+    doc_type = await classify_llm_async(ocr.text)
 
     print(f"  分类结果: {doc_type}")
 
@@ -0,0 +1,143 @@
+import os
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+NGRAM_MODEL_PATH = Path(os.getenv("NGRAM_MODEL_PATH", "models/ngram_classifier.npz"))
+
+# character 1- to 3-grams hashed into 2**HASH_BITS features: 4 classes
+# x 65536 float32 weights is a 1 MB model
+NGRAM_RANGE = (1, 3)
+HASH_BITS = 16
+
+_WHITESPACE = re.compile(r"\s+")
+_FNV_PRIME = np.uint64(0x100000001B3)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+Features = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (doc, feature, value) per nonzero
+
+
+def _codes(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Code points of all texts joined by 0 separators, and each text's start offset."""
+    cleaned = [_WHITESPACE.sub(" ", t.lower()).strip() for t in texts]
+    joined = "\0".join(cleaned) + "\0"
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    starts = np.cumsum([0] + [len(t) + 1 for t in cleaned[:-1]])
+    return codes, starts
+
+
+def featurize(texts: List[str], hash_bits: int = HASH_BITS, ngram_range=NGRAM_RANGE) -> Features:
+    """
+    Hashed character n-gram counts of a batch of texts, L2-normalised per
+    text, as sparse (doc, feature, value) triplets sorted by doc. Whitespace
+    runs count as one space; case is ignored.
+    """
+    codes, starts = _codes(texts)
+    sep = codes == 0
+    keys = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        count = len(codes) - n + 1
+        if count <= 0:
+            continue
+        h = np.full(count, n, dtype=np.uint64)
+        crosses = np.zeros(count, dtype=bool)
+        for k in range(n):
+            h = (h * _FNV_PRIME) ^ codes[k:k + count]
+            crosses |= sep[k:k + count]
+        pos = np.flatnonzero(~crosses)
+        feature = ((h[pos] * _GOLDEN) >> np.uint64(64 - hash_bits)).astype(np.int64)
+        doc = np.searchsorted(starts, pos, side="right") - 1
+        keys.append(doc << hash_bits | feature)
+
+    key, counts = np.unique(np.concatenate(keys) if keys else np.zeros(0, np.int64), return_counts=True)
+    doc, feature = key >> hash_bits, key & ((1 << hash_bits) - 1)
+    value = counts.astype(np.float32)
+    norms = np.sqrt(np.bincount(doc, weights=value ** 2, minlength=len(texts)))
+    value /= norms[doc].astype(np.float32)
+    return doc, feature, value
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class NgramClassifier:
+    """
+    Linear (softmax regression) document classifier on hashed character
+    n-grams; NumPy only. Scoring is a sparse dot product per class, so a
+    batch of texts costs a few array passes over their characters.
+    """
+
+    def __init__(self, classes: List[str], weights: np.ndarray, bias: np.ndarray, hash_bits: int = HASH_BITS):
+        self.classes = list(classes)
+        self.weights = weights  # (classes, 2**hash_bits)
+        self.bias = bias
+        self.hash_bits = hash_bits
+
+    def _logits(self, features: Features, n_docs: int) -> np.ndarray:
+        doc, feature, value = features
+        logits = np.empty((n_docs, len(self.classes)), dtype=np.float64)
+        for c in range(len(self.classes)):
+            logits[:, c] = np.bincount(doc, weights=value * self.weights[c, feature], minlength=n_docs)
+        return logits + self.bias
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """(texts, classes) probabilities, columns in self.classes order."""
+        if not texts:
+            return np.zeros((0, len(self.classes)))
+        return _softmax(self._logits(featurize(texts, self.hash_bits), len(texts)))
+
+    def predict(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """(type, probability) per text."""
+        proba = self.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        return [(self.classes[i], float(p[i])) for i, p in zip(best, proba)]
+
+    @classmethod
+    def fit(
+        cls,
+        texts: List[str],
+        labels: List[str],
+        hash_bits: int = HASH_BITS,
+        epochs: int = 300,
+        lr: float = 2.0,
+        l2: float = 1e-4,
+    ) -> "NgramClassifier":
+        """Full-batch gradient descent on the softmax cross-entropy."""
+        classes = sorted(set(labels))
+        y = np.zeros((len(texts), len(classes)))
+        y[np.arange(len(texts)), [classes.index(label) for label in labels]] = 1
+
+        model = cls(classes, np.zeros((len(classes), 1 << hash_bits), np.float32), np.zeros(len(classes)), hash_bits)
+        features = featurize(texts, hash_bits)
+        doc, feature, value = features
+        for _ in range(epochs):
+            grad = (_softmax(model._logits(features, len(texts))) - y) / len(texts)
+            for c in range(len(classes)):
+                g = np.bincount(feature, weights=value * grad[doc, c], minlength=1 << hash_bits)
+                model.weights[c] -= (lr * (g + l2 * model.weights[c])).astype(np.float32)
+            model.bias -= lr * grad.sum(axis=0)
+        return model
+
+    def save(self, path: Path = NGRAM_MODEL_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path, classes=np.array(self.classes), weights=self.weights,
+            bias=self.bias, hash_bits=self.hash_bits,
+        )
+
+    @classmethod
+    def load(cls, path: Path = NGRAM_MODEL_PATH) -> "NgramClassifier":
+        with np.load(path) as data:
+            return cls(
+                [str(c) for c in data["classes"]], data["weights"],
+                data["bias"], int(data["hash_bits"]),
+            )
+
+
+def load_ngram_classifier(path: Path = NGRAM_MODEL_PATH) -> Optional[NgramClassifier]:
+    """The trained model, or None if train_ngram_classifier.py has not been run."""
+    return NgramClassifier.load(path) if path.exists() else None
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+
+class OcrCache:
+    """
+    Persistent cache of OCR results in a SQLite file.
+
+    Entries are keyed by the hash of the image content plus the OCR engine
+    settings (model version and parameters) and hold the RapidOCR lines,
+    i.e. [box, text, score] per line. Entries are evicted least-recently-used
+    first once the stored results grow past max_bytes.
+    """
+
+    def __init__(self, db_path: str = "data/ocr_cache.sqlite", max_bytes: int = 64 * 1024 * 1024):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # one connection shared by the OCR threads; WAL lets worker
+        # processes with their own OcrCache read while another writes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr ("
+            " key TEXT PRIMARY KEY, lines TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, image: bytes, settings: str) -> str:
+        h = hashlib.sha256(image)
+        h.update(settings.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[list]]:
+        with self._lock:
+            row = self._conn.execute("SELECT lines FROM ocr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE ocr SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, lines: List[list]):
+        data = json.dumps(lines, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr (key, lines, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size_bytes": self.size_bytes()}
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # drop the least recently used rows until back under the limit
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM ocr ORDER BY last_used"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM ocr WHERE key = ?", stale)
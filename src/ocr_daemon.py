@@ -0,0 +1,214 @@
+"""
+Long-lived OCR service on a local Unix socket.
+
+    python -m src.ocr_daemon [--socket data/ocr_daemon.sock]
+    python -m src.ocr_daemon --stats
+
+The daemon loads the OCR engine once and serves OCR (and text direction,
+see src.orientation) requests from main.py / app.py runs, which connect to it when the socket exists and fall
+back to in-process OCR otherwise (see src.ocr_engine). Requests are
+pickled over multiprocessing.connection; the socket is created with mode
+0600, so only the same user can connect.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+OCR_DAEMON_SOCKET = os.getenv("OCR_DAEMON_SOCKET", "data/ocr_daemon.sock")
+LATENCY_WINDOW = 1000  # requests kept for the latency percentiles
+
+
+def _encode_image(image):
+    """ProcessedImage -> (name, contiguous RGB array); paths are sent as str."""
+    if hasattr(image, "array"):
+        return image.name, np.ascontiguousarray(image.array)
+    return str(image)
+
+
+def _decode_image(image):
+    from src.pre_processor import ProcessedImage
+
+    if isinstance(image, tuple):
+        name, array = image
+        return ProcessedImage(name=name, array=array, data=b"")
+    return Path(image)
+
+
+class DaemonClient:
+    """
+    Connection to a running daemon, one per calling thread. connect() returns
+    None when no daemon is listening; after a broken connection the client
+    stays disabled and callers fall back to in-process OCR.
+    """
+
+    def __init__(self, socket_path: str = OCR_DAEMON_SOCKET):
+        self.socket_path = socket_path
+        self.available = bool(socket_path) and Path(socket_path).exists()
+        self._local = threading.local()
+
+    def connect(self) -> Optional[Connection]:
+        if not self.available:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.socket_path, family="AF_UNIX")
+            except OSError:
+                self.available = False
+                return None
+            self._local.conn = conn
+        return conn
+
+    def request(self, op: str, payload=None):
+        """Send one request; returns None if the daemon is not usable."""
+        conn = self.connect()
+        if conn is None:
+            return None
+        try:
+            conn.send((op, payload))
+            status, result = conn.recv()
+        except (OSError, EOFError):
+            self.available = False
+            self._local.conn = None
+            return None
+        if status != "ok":
+            raise RuntimeError(f"OCR daemon error: {result}")
+        return result
+
+    def ocr_lines(self, image, profile: str) -> Optional[list]:
+        return self.request("ocr", (_encode_image(image), profile))
+
+    def ocr_lines_batch(self, images: list, profile: str) -> Optional[list]:
+        return self.request("ocr_batch", ([_encode_image(i) for i in images], profile))
+
+    def text_cls(self, crops: list, profile: str) -> Optional[list]:
+        return self.request("text_cls", ([np.ascontiguousarray(c) for c in crops], profile))
+
+    def stats(self) -> Optional[dict]:
+        return self.request("stats")
+
+
+class OcrDaemon:
+    """Serves OCR requests with shared engines (one per profile) and OCR_THREADS workers."""
+
+    def __init__(self, socket_path: str = OCR_DAEMON_SOCKET):
+        from src import ocr_engine
+
+        self.engine = ocr_engine
+        ocr_engine._daemon = DaemonClient("")  # never forward to ourselves
+        self.socket_path = Path(socket_path)
+        self.executor = ThreadPoolExecutor(max_workers=ocr_engine.OCR_THREADS)
+        self.started = time.time()
+        self.queued = 0
+        self.running = 0
+        self.served = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def _run(self, op: str, payload, submitted: float):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            images, profile = payload
+            if op == "ocr":
+                return self.engine._ocr_lines(_decode_image(images), profile)
+            if op == "text_cls":
+                return self.engine.text_cls(images, profile)
+            return self.engine._ocr_lines_batch([_decode_image(i) for i in images], profile)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.served += 1
+                self.latencies.append(time.perf_counter() - submitted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            stats = {
+                "queue_depth": self.queued,
+                "running": self.running,
+                "served": self.served,
+                "uptime_seconds": round(time.time() - self.started, 1),
+            }
+        if len(latencies):
+            stats["latency_ms"] = {
+                "mean": round(float(latencies.mean()), 1),
+                "p50": round(float(np.percentile(latencies, 50)), 1),
+                "p95": round(float(np.percentile(latencies, 95)), 1),
+            }
+        stats["engine"] = self.engine.engine_stats()
+        return stats
+
+    def _handle(self, conn: Connection):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op == "stats":
+                        result = self.stats()
+                    elif op in ("ocr", "ocr_batch", "text_cls"):
+                        with self._lock:
+                            self.queued += 1
+                        future = self.executor.submit(self._run, op, payload, time.perf_counter())
+                        result = future.result()
+                    else:
+                        raise ValueError(f"unknown op: {op}")
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", repr(e)))
+
+    def serve_forever(self):
+        self.engine.warm_up()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        old_umask = os.umask(0o177)  # socket file 0600
+        try:
+            listener = Listener(str(self.socket_path), family="AF_UNIX")
+        finally:
+            os.umask(old_umask)
+
+        print(f"🟢 OCR daemon listening on {self.socket_path}")
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=OCR_DAEMON_SOCKET)
+    parser.add_argument("--stats", action="store_true", help="print a running daemon's stats")
+    args = parser.parse_args()
+
+    if args.stats:
+        stats = DaemonClient(args.socket).stats()
+        print(json.dumps(stats, indent=2) if stats is not None else "OCR daemon not running")
+        return
+
+    try:
+        OcrDaemon(args.socket).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
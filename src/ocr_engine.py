@@ -0,0 +1,635 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import multiprocessing
+from dataclasses import dataclass, field
+from importlib.metadata import version
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from rapidocr_onnxruntime import RapidOCR
+
+from src.ocr_cache import OcrCache
+from src.ocr_daemon import DaemonClient
+from src.pre_processor import (
+    ProcessedImage,
+    TextLayer,
+    header_bands,
+    needs_tiling,
+    split_tiles,
+    tile_bounds,
+)
+
+try:
+    import psutil
+except ImportError:  # optional, only used for memory stats
+    psutil = None
+
+
+# RapidOCR constructor arguments per registered engine (OCR profile)
+ENGINE_CONFIGS = {
+    "default": dict(
+        lang="ch",
+        providers=["CUDAExecutionProvider", "CPUExecutionProvider"],
+    ),
+}
+
+# INT8 models are produced by `python bench_ocr_profiles.py --quantize`
+OCR_MODEL_DIR = Path(os.getenv("OCR_MODEL_DIR", "models/ocr"))
+# the detector scales the shorter side up/down to det_limit_side_len (736)
+ENGINE_CONFIGS["small_det"] = {**ENGINE_CONFIGS["default"], "det_limit_side_len": 480}
+ENGINE_CONFIGS["int8"] = {
+    **ENGINE_CONFIGS["default"],
+    "det_model_path": str(OCR_MODEL_DIR / "ch_PP-OCRv4_det_infer.int8.onnx"),
+    "rec_model_path": str(OCR_MODEL_DIR / "ch_PP-OCRv4_rec_infer.int8.onnx"),
+}
+ENGINE_CONFIGS["int8_small_det"] = {**ENGINE_CONFIGS["int8"], "det_limit_side_len": 480}
+
+# profile used when run_ocr & co. are not given one
+OCR_PROFILE = os.getenv("OCR_PROFILE", "default")
+
+# cross-document batched recognition (ocr_batch / run_ocr_batch_async).
+# Pooling line crops from many pages is what pays off: on one core, pooled
+# aspect-sorted crops in RapidOCR's default rec batches of 6 were ~1.5x
+# faster than per-image OCR, while batches of 16+ were slower (more
+# padding, worse cache behaviour), so the default engine is reused as is.
+REC_BUCKETS_PER_OCTAVE = 4  # aspect-ratio buckets: padding within a batch < 2**(1/4)
+BATCH_PAGES = 32  # pages per ocr_batch call dispatched to the executor
+
+OCR_THREADS = 8
+
+# "thread": OCR_THREADS threads sharing one engine in this process.
+# "process": worker processes, each with its own engine limited to
+# OCR_INTRA_OP_THREADS ONNX Runtime threads (see bench_ocr_backend.py).
+OCR_BACKEND = os.getenv("OCR_BACKEND", "thread")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or None  # None: cores / intra-op threads
+OCR_INTRA_OP_THREADS = int(os.getenv("OCR_INTRA_OP_THREADS", "1"))
+WARM_UP_TIMEOUT = 300  # seconds for every worker process to load its engine
+
+# persistent OCR results, shared by main.py, app.py and the eval scripts;
+# set OCR_CACHE_PATH="" to disable
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/ocr_cache.sqlite")
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "64"))
+
+# engine arguments that change speed but not the recognised text
+RUNTIME_PARAMS = {"providers", "intra_op_num_threads", "inter_op_num_threads"}
+
+ocr_executor = ThreadPoolExecutor(max_workers=OCR_THREADS)
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_workers = 0
+_ocr_cache: Optional[OcrCache] = None
+_daemon: Optional[DaemonClient] = None
+
+_engines: Dict[str, RapidOCR] = {}
+_stats: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _rss_mb() -> float:
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss / 2**20
+    # fall back to /proc (Linux); pages -> MB
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _check_models(name: str):
+    """ValueError for a profile whose model files are missing (e.g. not quantized yet)."""
+    config = ENGINE_CONFIGS[name]
+    for key in ("det_model_path", "rec_model_path"):
+        if key in config and not Path(config[key]).exists():
+            raise ValueError(f"OCR profile {name!r}: missing model {config[key]}")
+
+
+def get_ocr(name: Optional[str] = None) -> RapidOCR:
+    """
+    Return the shared RapidOCR engine `name` (default OCR_PROFILE), loading
+    its models on first use. Load time and the RSS growth of the load are
+    recorded in engine_stats().
+    """
+    name = name or OCR_PROFILE
+    engine = _engines.get(name)
+    if engine is not None:
+        return engine
+
+    with _lock:
+        if name not in _engines:
+            _check_models(name)
+            rss_before = _rss_mb()
+            start = time.perf_counter()
+            _engines[name] = RapidOCR(**ENGINE_CONFIGS[name])
+            _stats[name] = {
+                "load_seconds": round(time.perf_counter() - start, 3),
+                "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+            }
+        return _engines[name]
+
+
+def _init_ocr_worker(name: str, intra_op_threads: int):
+    global OCR_PROFILE
+    OCR_PROFILE = name
+    ENGINE_CONFIGS[name] = {
+        **ENGINE_CONFIGS[name],
+        "intra_op_num_threads": intra_op_threads,
+        "inter_op_num_threads": 1,
+    }
+    get_ocr(name)
+
+
+def default_workers(intra_op_threads: int = OCR_INTRA_OP_THREADS) -> int:
+    return max(1, (os.cpu_count() or 1) // intra_op_threads)
+
+
+def make_process_backend(
+    workers: Optional[int] = None,
+    intra_op_threads: int = OCR_INTRA_OP_THREADS,
+    name: Optional[str] = None,
+) -> ProcessPoolExecutor:
+    """
+    Pool of OCR worker processes, each loading its own engine `name` with
+    `intra_op_threads` ONNX Runtime threads. Workers default to
+    cores // intra_op_threads so the machine is not oversubscribed.
+    """
+    workers = workers or default_workers(intra_op_threads)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        # spawn: never fork a process that already has ORT threads running
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_ocr_worker,
+        initargs=(name or OCR_PROFILE, intra_op_threads),
+    )
+
+
+def get_executor() -> Executor:
+    """Executor that run_ocr_async dispatches to, per OCR_BACKEND."""
+    global _process_pool, _process_workers
+    if OCR_BACKEND != "process":
+        return ocr_executor
+    if _process_pool is None:
+        _process_workers = OCR_WORKERS or default_workers()
+        _process_pool = make_process_backend(_process_workers)
+    return _process_pool
+
+
+def get_daemon() -> Optional[DaemonClient]:
+    """Client of a running OCR daemon (src.ocr_daemon), or None to OCR in-process."""
+    global _daemon
+    if _daemon is None:
+        _daemon = DaemonClient()
+    return _daemon if _daemon.available else None
+
+
+def _warm_engine(name: str) -> dict:
+    engine = get_ocr(name)
+    start = time.perf_counter()
+    engine(np.full((32, 32, 3), 255, dtype=np.uint8))
+    _stats[name]["warm_up_seconds"] = round(time.perf_counter() - start, 3)
+    return engine_stats()[name]
+
+
+def _warm_up_worker(name: str, barrier) -> dict:
+    _warm_engine(name)
+    # hold this worker until every other one has a task too, so each
+    # worker gets exactly one
+    barrier.wait(WARM_UP_TIMEOUT)
+    return {"pid": os.getpid(), **engine_stats()}
+
+
+def warm_up(name: Optional[str] = None) -> dict:
+    """
+    Load engine `name` and run one tiny image through it; returns its stats.
+    With the process backend every worker is warmed and reports its own
+    engine stats (under "workers").
+    """
+    name = name or OCR_PROFILE
+    daemon = get_daemon()
+    if daemon is not None:
+        stats = daemon.stats()
+        if stats is not None:
+            return {"daemon": stats}
+
+    if OCR_BACKEND == "process":
+        executor = get_executor()
+        with multiprocessing.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(_process_workers)
+            futures = [
+                executor.submit(_warm_up_worker, name, barrier)
+                for _ in range(_process_workers)
+            ]
+            return {"workers": [f.result() for f in futures]}
+
+    return _warm_engine(name)
+
+
+def engine_stats() -> dict:
+    """Per-engine load stats plus the current process RSS."""
+    stats = {**{k: dict(v) for k, v in _stats.items()}, "rss_mb": round(_rss_mb(), 1)}
+    if _ocr_cache is not None:
+        stats["ocr_cache"] = _ocr_cache.stats()
+    return stats
+
+
+def get_ocr_cache() -> Optional[OcrCache]:
+    """
+    The OCR result cache of this process, or None if OCR_CACHE_PATH is empty.
+    With the process backend each worker opens its own (hit/miss counters
+    are per process; the SQLite file is shared).
+    """
+    global _ocr_cache
+    if not OCR_CACHE_PATH:
+        return None
+    with _lock:
+        if _ocr_cache is None:
+            _ocr_cache = OcrCache(OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024)
+    return _ocr_cache
+
+
+def _cache_settings(name: str) -> str:
+    # per-image and batched OCR share entries: same models and parameters
+    _check_models(name)
+    params = {k: v for k, v in ENGINE_CONFIGS[name].items() if k not in RUNTIME_PARAMS}
+    for key in ("det_model_path", "rec_model_path"):
+        if key in params:  # a re-quantized model must not hit old entries
+            params[key] += f"@{os.path.getmtime(params[key]):.0f}"
+    return f"rapidocr_onnxruntime=={version('rapidocr_onnxruntime')}|{json.dumps(params, sort_keys=True)}"
+
+
+def _cache_key(cache: OcrCache, path: Union[Path, ProcessedImage], profile: str) -> str:
+    if isinstance(path, ProcessedImage):
+        array = np.ascontiguousarray(path.array)
+        image = str(array.shape).encode("ascii") + array.tobytes()
+    else:
+        image = Path(path).read_bytes()
+    return cache.key(image, _cache_settings(profile))
+
+
+@dataclass
+class OcrResult:
+    """
+    OCR output of one page: `boxes` is an (N, 4, 2) float32 array of line
+    corners in pixels of the OCR'd image, `texts` and `scores` are per line.
+    For text-layer pages the entries are the embedded words (score 1.0).
+    """
+    boxes: np.ndarray
+    texts: List[str]
+    scores: np.ndarray
+    _text: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def text(self) -> str:
+        """Lines joined with newlines, built once on first access."""
+        if self._text is None:
+            self._text = "\n".join(self.texts)
+        return self._text
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_lines(cls, lines: Sequence[list], origin: Tuple[int, int] = (0, 0)) -> "OcrResult":
+        """From RapidOCR-style [box, text, score] lines, shifted by `origin`."""
+        boxes = np.array([line[0] for line in lines], dtype=np.float32).reshape(-1, 4, 2)
+        boxes += np.array(origin, dtype=np.float32)
+        scores = np.array([line[2] for line in lines], dtype=np.float32)
+        return cls(boxes, [line[1] for line in lines], scores)
+
+    @classmethod
+    def from_text_layer(cls, layer: TextLayer) -> "OcrResult":
+        rects = np.array([w[:4] for w in layer.words], dtype=np.float32).reshape(-1, 4)
+        x0, y0, x1, y1 = rects.T
+        boxes = np.stack(
+            [np.stack(corner, axis=1) for corner in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))],
+            axis=1,
+        )
+        scores = np.ones(len(rects), dtype=np.float32)
+        return cls(boxes, [w[4] for w in layer.words], scores, _text=layer.text)
+
+    @classmethod
+    def concat(cls, results: Sequence["OcrResult"]) -> "OcrResult":
+        if not results:
+            return cls.from_lines([])
+        return cls(
+            np.concatenate([r.boxes for r in results]),
+            [t for r in results for t in r.texts],
+            np.concatenate([r.scores for r in results]),
+        )
+
+
+def _ocr_input(path: Union[Path, ProcessedImage]):
+    # RapidOCR reads 3-channel arrays as BGR; flip the RGB view without copying
+    if isinstance(path, ProcessedImage):
+        return path.array[:, :, ::-1]
+    return str(path)
+
+
+def _ocr_lines(path: Union[Path, ProcessedImage], profile: Optional[str] = None) -> list:
+    profile = profile or OCR_PROFILE
+    daemon = get_daemon()
+    if daemon is not None:
+        lines = daemon.ocr_lines(path, profile)
+        if lines is not None:
+            return lines
+
+    cache = get_ocr_cache()
+    if cache is not None:
+        key = _cache_key(cache, path, profile)
+        lines = cache.get(key)
+        if lines is not None:
+            return lines
+
+    result, _ = get_ocr(profile)(_ocr_input(path))
+    lines = result or []
+    if cache is not None:
+        cache.put(key, lines)
+    return lines
+
+
+def text_cls(crops: List[np.ndarray], profile: Optional[str] = None) -> List[Tuple[str, float]]:
+    """
+    RapidOCR's 0/180 text direction classifier on BGR line crops: (label,
+    score) per crop. Runs in the OCR daemon when one is running, so callers
+    do not load an engine of their own.
+    """
+    profile = profile or OCR_PROFILE
+    daemon = get_daemon()
+    if daemon is not None:
+        cls_res = daemon.text_cls(crops, profile)
+        if cls_res is not None:
+            return cls_res
+
+    _, cls_res, _ = get_ocr(profile).text_cls(crops)
+    return [(label, float(score)) for label, score in cls_res]
+
+
+def _owned_lines(tile: ProcessedImage, bounds: Tuple[int, int], lines: list) -> OcrResult:
+    """The lines of a tile whose center lies in its owned y-range, in page coordinates."""
+    own_top, own_bottom = bounds
+    result = OcrResult.from_lines(lines, origin=tile.origin)
+    center_y = result.boxes[:, :, 1].mean(axis=1)
+    mask = (own_top <= center_y) & (center_y < own_bottom)
+    return OcrResult(
+        result.boxes[mask],
+        [t for t, m in zip(result.texts, mask) if m],
+        result.scores[mask],
+    )
+
+
+def _merge_tiles(page: ProcessedImage, tiles: list, tile_results: list) -> OcrResult:
+    """
+    Join tile OCR results top to bottom, with boxes in page coordinates.
+    A line is kept only from the tile that owns its center, which drops the
+    copies read in the overlaps. Per-tile texts are stored on the page for
+    select_tiles() (in the calling process only, see _ocr_batch_job).
+    """
+    kept = [
+        _owned_lines(tile, bounds, lines)
+        for tile, bounds, lines in zip(tiles, tile_bounds(tiles), tile_results)
+    ]
+    page.tile_texts = [r.text for r in kept]
+    return OcrResult.concat(kept)
+
+
+def run_ocr(path: Union[Path, ProcessedImage], profile: Optional[str] = None) -> OcrResult:
+    """OCR one page with OCR profile `profile` (default OCR_PROFILE)."""
+    # digital PDFs: use the embedded text, OCR is only the fallback
+    if isinstance(path, ProcessedImage) and path.text_layer is not None:
+        return OcrResult.from_text_layer(path.text_layer)
+
+    if needs_tiling(path):
+        tiles = split_tiles(path)
+        return _merge_tiles(path, tiles, [_ocr_lines(t, profile) for t in tiles])
+
+    return OcrResult.from_lines(_ocr_lines(path, profile))
+
+
+async def run_ocr_async(path: Union[Path, ProcessedImage], profile: Optional[str] = None) -> OcrResult:
+    if isinstance(path, ProcessedImage) and path.text_layer is not None:
+        return OcrResult.from_text_layer(path.text_layer)
+
+    loop = asyncio.get_event_loop()
+    executor = get_executor()
+
+    # tall pages: OCR the tiles in parallel
+    if needs_tiling(path):
+        tiles = split_tiles(path)
+        results = await asyncio.gather(
+            *[loop.run_in_executor(executor, _ocr_lines, t, profile) for t in tiles]
+        )
+        return _merge_tiles(path, tiles, results)
+
+    return await loop.run_in_executor(executor, run_ocr, path, profile)
+
+
+async def iter_ocr_regions(
+    pages: list, profile: Optional[str] = None, first: Optional[OcrResult] = None
+) -> AsyncIterator[OcrResult]:
+    """
+    OCR a document region by region, top of the first page first, for
+    callers that can stop early (header-first classification). Image pages
+    are read as header_bands(), each yielding only the lines it owns, so
+    the time to the first region does not grow with the page size.
+    Text-layer pages and paths are yielded whole. `first` is the first
+    region already read (see ocr_first_regions).
+    """
+    loop = asyncio.get_event_loop()
+    executor = get_executor()
+    for page_idx, page in enumerate(pages):
+        if not isinstance(page, ProcessedImage) or page.text_layer is not None:
+            if page_idx == 0 and first is not None:
+                yield first
+            else:
+                yield await run_ocr_async(page, profile)
+            continue
+
+        bands = header_bands(page)
+        for band_idx, (band, bounds) in enumerate(zip(bands, tile_bounds(bands))):
+            if page_idx == 0 and band_idx == 0 and first is not None:
+                yield first
+                continue
+            lines = await loop.run_in_executor(executor, _ocr_lines, band, profile)
+            yield _owned_lines(band, bounds, lines)
+
+
+async def ocr_first_regions(docs: list, profile: Optional[str] = None) -> List[OcrResult]:
+    """
+    The first region iter_ocr_regions() reads of each document (a list of
+    pages), for many documents at once: the header bands of all of them go
+    through the pooled recognition of _ocr_lines_batch, in chunks of
+    BATCH_PAGES, instead of one OCR call each.
+    """
+    loop = asyncio.get_event_loop()
+    executor = get_executor()
+    results: List[Optional[OcrResult]] = [None] * len(docs)
+
+    bands, owners, whole = [], [], []
+    for i, pages in enumerate(docs):
+        page = pages[0]
+        if isinstance(page, ProcessedImage) and page.text_layer is None:
+            page_bands = header_bands(page)
+            bands.append((page_bands[0], tile_bounds(page_bands)[0]))
+            owners.append(i)
+        else:
+            whole.append(i)
+
+    chunks = [bands[i:i + BATCH_PAGES] for i in range(0, len(bands), BATCH_PAGES)]
+    chunk_lines, whole_results = await asyncio.gather(
+        asyncio.gather(*[
+            loop.run_in_executor(executor, _ocr_lines_batch, [band for band, _ in chunk], profile)
+            for chunk in chunks
+        ]),
+        asyncio.gather(*[run_ocr_async(docs[i][0], profile) for i in whole]),
+    )
+    lines = [band_lines for chunk in chunk_lines for band_lines in chunk]
+    for i, (band, bounds), band_lines in zip(owners, bands, lines):
+        results[i] = _owned_lines(band, bounds, band_lines)
+    for i, result in zip(whole, whole_results):
+        results[i] = result
+    return results
+
+
+def _detect(engine: RapidOCR, page: Union[Path, ProcessedImage]):
+    """
+    Detection half of RapidOCR.__call__ (rapidocr-onnxruntime 1.4.x):
+    returns boxes in page coordinates and the matching line crops.
+    """
+    img = engine.load_img(_ocr_input(page))
+    raw_h, raw_w = img.shape[:2]
+
+    img, ratio_h, ratio_w = engine.preprocess(img)
+    op_record = {"preprocess": {"ratio_h": ratio_h, "ratio_w": ratio_w}}
+    img, op_record = engine.maybe_add_letterbox(img, op_record)
+
+    dt_boxes, _ = engine.auto_text_det(img)
+    if dt_boxes is None:
+        return None, []
+
+    crops = engine.get_crop_img_list(img, dt_boxes)
+    return engine._get_origin_points(dt_boxes, op_record, raw_h, raw_w), crops
+
+
+def _ocr_lines_batch(images: list, profile: Optional[str] = None) -> List[list]:
+    """
+    OCR many images with one pooled recognition pass: detect per image,
+    then classify and recognise all line crops together, grouped into
+    narrow aspect-ratio buckets so padding within a batch stays small.
+    Images found in the OCR cache are skipped, and everything goes to the
+    OCR daemon when one is running. Returns RapidOCR-style lines per image.
+    """
+    profile = profile or OCR_PROFILE
+    daemon = get_daemon()
+    if daemon is not None:
+        results = daemon.ocr_lines_batch(images, profile)
+        if results is not None:
+            return results
+
+    results = [[] for _ in images]
+    cache = get_ocr_cache()
+    keys = [_cache_key(cache, image, profile) for image in images] if cache is not None else []
+
+    todo = []
+    for i in range(len(images)):
+        lines = cache.get(keys[i]) if cache is not None else None
+        if lines is None:
+            todo.append(i)
+        else:
+            results[i] = lines
+    if not todo:
+        return results
+
+    engine = get_ocr(profile)
+
+    boxes, crops, owners = [], [], []
+    for i in todo:
+        img_boxes, img_crops = _detect(engine, images[i])
+        if img_boxes is None:
+            continue
+        boxes.extend(img_boxes)
+        crops.extend(img_crops)
+        owners.extend([i] * len(img_crops))
+
+    if crops:
+        _recognise(engine, boxes, crops, owners, results)
+
+    if cache is not None:
+        for i in todo:
+            cache.put(keys[i], results[i])
+    return results
+
+
+def _recognise(engine: RapidOCR, boxes: list, crops: list, owners: list, results: List[list]):
+    """Pooled cls + rec over `crops`; appends each kept line to results[owner]."""
+    if engine.use_cls:
+        crops, _, _ = engine.text_cls(crops)
+
+    buckets: Dict[int, List[int]] = {}
+    for idx, crop in enumerate(crops):
+        h, w = crop.shape[:2]
+        key = int(np.log2(max(w / h, 1.0)) * REC_BUCKETS_PER_OCTAVE)
+        buckets.setdefault(key, []).append(idx)
+
+    rec_res = [None] * len(crops)
+    for indices in buckets.values():
+        bucket_res, _ = engine.text_rec([crops[i] for i in indices])
+        for i, res in zip(indices, bucket_res):
+            rec_res[i] = res
+
+    for box, (text, score, *_), owner in zip(boxes, rec_res, owners):
+        if float(score) >= engine.text_score:
+            results[owner].append([box.tolist(), text, float(score)])
+
+
+def ocr_batch(pages: list, profile: Optional[str] = None) -> List[OcrResult]:
+    """
+    Batched counterpart of run_ocr for many pages at once. Text-layer pages
+    are skipped and tall pages are expanded into tiles, which are merged
+    back per page.
+    """
+    results: List[Optional[OcrResult]] = [None] * len(pages)
+    images, spans = [], []  # spans: (page index, tiles or None, start, end)
+
+    for i, page in enumerate(pages):
+        if isinstance(page, ProcessedImage) and page.text_layer is not None:
+            results[i] = OcrResult.from_text_layer(page.text_layer)
+            continue
+        tiles = split_tiles(page) if needs_tiling(page) else None
+        start = len(images)
+        images.extend(tiles or [page])
+        spans.append((i, tiles, start, len(images)))
+
+    lines = _ocr_lines_batch(images, profile)
+    for i, tiles, start, end in spans:
+        if tiles is not None:
+            results[i] = _merge_tiles(pages[i], tiles, lines[start:end])
+        else:
+            results[i] = OcrResult.from_lines(lines[start])
+    return results
+
+
+def _ocr_batch_job(pages: list, profile: Optional[str] = None) -> Tuple[List[OcrResult], list]:
+    """
+    ocr_batch for the executor, also returning each page's tile_texts: a
+    worker process sets them on its own copy of the pages.
+    """
+    results = ocr_batch(pages, profile)
+    return results, [getattr(page, "tile_texts", None) for page in pages]
+
+
+async def run_ocr_batch_async(pages: list, profile: Optional[str] = None) -> List[OcrResult]:
+    """Run ocr_batch on chunks of BATCH_PAGES pages in the OCR executor."""
+    loop = asyncio.get_event_loop()
+    executor = get_executor()
+    chunks = [pages[i:i + BATCH_PAGES] for i in range(0, len(pages), BATCH_PAGES)]
+    jobs = await asyncio.gather(
+        *[loop.run_in_executor(executor, _ocr_batch_job, chunk, profile) for chunk in chunks]
+    )
+    results = []
+    for chunk, (chunk_results, tile_texts) in zip(chunks, jobs):
+        for page, texts in zip(chunk, tile_texts):
+            if texts is not None:
+                page.tile_texts = texts
+        results.extend(chunk_results)
+    return results
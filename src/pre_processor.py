@@ -1,63 +1,814 @@
+import io
 import os
+import re
+import threading
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import fitz  # PyMuPDF
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageOps
 
+from src.preprocess_cache import PreprocessCache, link_or_copy
 
 
-def preprocess_file(input_path: Path, output_dir: Path) -> Path:
+PDF_ZOOM = 2
+JPEG_QUALITY = 95
+RENDER_WORKERS = os.cpu_count() or 1
+
+# JPEGs within these limits are used as-is (no decode / re-encode)
+PASSTHROUGH_MAX_SIDE = 4096
+EXIF_ORIENTATION = 0x0112
+
+# parallel batch preprocessing (iter_preprocess / PreProcessor)
+PREPROCESS_WORKERS = os.cpu_count() or 1
+MAX_PIXELS_IN_FLIGHT = 300_000_000  # ~900 MB of decoded RGB
+
+# released pages (ProcessedImage.release) keep their pixels zlib-compressed:
+# lossless, ~2x the q95 JPEG and 1/15 of the raw pixels on the sample
+# corpus. The most recently decompressed ones are kept up to
+# DECODE_CACHE_PIXELS, so a stage that reads a page several times
+# (thumbnail, hashes, tiles) decompresses it once.
+SPILL_ZLIB_LEVEL = 1
+DECODE_CACHE_PIXELS = 20_000_000  # ~60 MB of decoded RGB
+
+# a PDF text layer is trusted only if it is long enough and mostly made of
+# characters we expect on receipts (broken font maps yield rare CJK/Arabic)
+MIN_TEXT_LAYER_CHARS = 20
+MIN_TEXT_LAYER_RATIO = 0.9
+
+# resolution pyramid: a small image for classification OCR, and a
+# per-type pixel budget for the image sent to the VLM
+CLASSIFY_MAX_SIDE = 800
+EXTRACT_PIXEL_BUDGET = {
+    "itinerary": 2_400_000,
+    "hotel_invoice": 1_200_000,
+    "payment": 1_000_000,
+    "other": 1_500_000,
+}
+
+# tall screenshots are OCR'd and sent to the VLM as overlapping tiles
+TILE_MIN_ASPECT = 2.0      # tile pages whose height / width exceeds this
+TILE_HEIGHT_RATIO = 1.2    # tile height as a multiple of the page width
+TILE_OVERLAP = 0.15        # overlap as a fraction of the tile height
+HEADER_BAND_RATIO = 0.4    # header-first classification: first band height / page width
+RELEVANT_TILE_PATTERN = re.compile(
+    r"\d+\.\d{2}|支付|付款|金额|交易|订单|商户|payment|amount|merchant",
+    re.IGNORECASE,
+)
+
+# shared pool for page rendering, created on first multi-page PDF
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+# decoded released pages: id(page) -> (page, array), least recently used first
+_decoded: "OrderedDict[int, tuple]" = OrderedDict()
+_decoded_pixels = 0
+_decoded_lock = threading.Lock()
+
+
+@dataclass
+class TextLayer:
+    """
+    Text of a born-digital PDF page.
+    Word boxes are (x0, y0, x1, y1, word) in pixel coordinates of the render.
+    """
+    text: str
+    words: List[Tuple[float, float, float, float, str]]
+
+
+@dataclass(init=False)
+class ProcessedImage:
+    """
+    A preprocessed page kept in memory.
+    `array` is the decoded RGB image (fed to OCR), `data` the encoded JPEG
+    (sent to the VLM). `path` is only set when a disk copy was written.
+    `text_layer` is set for PDF pages with a usable text layer, in which
+    case OCR is skipped. For PDF pages `array` is a zero-copy view of the
+    PyMuPDF pixmap.
+
+    Tiles of a tall page are ProcessedImages too, with `origin` giving their
+    (x, y) offset in the page; `tile_texts` is filled by the tiled OCR pass.
+
+    release() swaps the pixels of a page that is held for later for a
+    lossless compressed copy; `array` then decompresses it on access, with
+    recent results cached up to DECODE_CACHE_PIXELS.
+    """
+    name: str
+    data: bytes
+    path: Optional[Path] = None
+    mime: str = "image/jpeg"
+    text_layer: Optional[TextLayer] = None
+    origin: Tuple[int, int] = (0, 0)
+    tile_texts: Optional[List[str]] = None
+    _array: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    _shape: Optional[Tuple[int, ...]] = field(default=None, repr=False, compare=False)
+    _spill: Optional[bytes] = field(default=None, repr=False, compare=False)
+
+    def __init__(
+        self,
+        name: str,
+        array: np.ndarray,
+        data: bytes,
+        path: Optional[Path] = None,
+        mime: str = "image/jpeg",
+        text_layer: Optional[TextLayer] = None,
+        origin: Tuple[int, int] = (0, 0),
+        tile_texts: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.data = data
+        self.path = path
+        self.mime = mime
+        self.text_layer = text_layer
+        self.origin = origin
+        self.tile_texts = tile_texts
+        self._array = array
+        self._shape = None
+        self._spill = None
+
+    def __str__(self) -> str:
+        return str(self.path) if self.path else self.name
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is not None:
+            return self._array
+        return _decompress(self)
+
+    @array.setter
+    def array(self, array: np.ndarray):
+        _uncache(self)
+        self._array = array
+        self._spill = None
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Shape of `array`, without decoding a released page."""
+        return self._array.shape if self._array is not None else self._shape
+
+    def release(self):
+        if self._array is None:
+            return
+        array = np.ascontiguousarray(self._array)
+        self._shape = array.shape
+        self._spill = zlib.compress(array, SPILL_ZLIB_LEVEL)
+        self._array = None
+
+
+def _decompress(page: ProcessedImage) -> np.ndarray:
+    """Pixels of a released page (read-only), through the decode cache."""
+    global _decoded_pixels
+    with _decoded_lock:
+        entry = _decoded.get(id(page))
+        if entry is not None:
+            _decoded.move_to_end(id(page))
+            return entry[1]
+
+    array = np.frombuffer(zlib.decompress(page._spill), dtype=np.uint8).reshape(page._shape)
+    with _decoded_lock:
+        if id(page) not in _decoded:
+            _decoded[id(page)] = (page, array)
+            _decoded_pixels += array.shape[0] * array.shape[1]
+        while _decoded_pixels > DECODE_CACHE_PIXELS and len(_decoded) > 1:
+            _, (_, old) = _decoded.popitem(last=False)
+            _decoded_pixels -= old.shape[0] * old.shape[1]
+    return array
+
+
+def _uncache(page: ProcessedImage):
+    global _decoded_pixels
+    with _decoded_lock:
+        entry = _decoded.pop(id(page), None)
+        if entry is not None:
+            _decoded_pixels -= entry[1].shape[0] * entry[1].shape[1]
+
+
+class _PixmapView:
+    """
+    Exposes a pixmap's samples through __array_interface__, so that
+    np.asarray() returns a view whose .base keeps the pixmap alive.
+    """
+
+    def __init__(self, pix: "fitz.Pixmap"):
+        self.pix = pix
+        self.__array_interface__ = {
+            "shape": (pix.height, pix.width, pix.n),
+            "typestr": "|u1",
+            "data": (pix.samples_ptr, True),  # read-only
+            "version": 3,
+        }
+
+
+def _encode_jpeg(img: Union[Image.Image, np.ndarray]) -> bytes:
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=JPEG_QUALITY)
+    return buf.getvalue()
+
+
+def _scaled(page: ProcessedImage, scale: float, encode: bool) -> ProcessedImage:
+    h, w = page.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    img = Image.fromarray(page.array).resize(size, Image.BILINEAR)
+
+    data = _encode_jpeg(img) if encode else page.data
+
+    text_layer = page.text_layer
+    if text_layer is not None:
+        text_layer = TextLayer(
+            text=text_layer.text,
+            words=[
+                (x0 * scale, y0 * scale, x1 * scale, y1 * scale, word)
+                for x0, y0, x1, y1, word in text_layer.words
+            ],
+        )
+
+    return ProcessedImage(
+        name=page.name,
+        array=np.asarray(img),
+        data=data,
+        path=None,
+        mime=page.mime,
+        text_layer=text_layer,
+        tile_texts=page.tile_texts,
+    )
+
+
+def make_thumbnail(page, max_side: int = CLASSIFY_MAX_SIDE):
+    """
+    Downscale a page for classification OCR (longest side <= max_side;
+    for pages that will be tiled, the width is bounded instead).
+    Only the array is resized; `data` still holds the full-size JPEG.
+    Paths and pages that are already small are returned unchanged.
+    """
+    if not isinstance(page, ProcessedImage):
+        return page
+    h, w = page.shape[:2]
+    longest = w if needs_tiling(page) else max(h, w)
+    if longest <= max_side:
+        return page
+    return _scaled(page, max_side / longest, encode=False)
+
+
+def resize_for_extraction(page, doc_type: str):
+    """
+    Cap a page at the VLM pixel budget of its document type.
+    Paths and pages within budget are returned unchanged.
+    """
+    if not isinstance(page, ProcessedImage):
+        return page
+    budget = EXTRACT_PIXEL_BUDGET.get(doc_type, EXTRACT_PIXEL_BUDGET["other"])
+    h, w = page.shape[:2]
+    if h * w <= budget:
+        return page
+    return _scaled(page, (budget / (h * w)) ** 0.5, encode=True)
+
+
+def needs_tiling(page) -> bool:
+    if not isinstance(page, ProcessedImage):
+        return False
+    h, w = page.shape[:2]
+    return h / w > TILE_MIN_ASPECT
+
+
+def split_tiles(page: ProcessedImage, height_ratio: float = TILE_HEIGHT_RATIO) -> List[ProcessedImage]:
+    """
+    Split a tall page into overlapping full-width tiles, top to bottom.
+    Tile arrays are views into the page; `data` is left empty and only
+    encoded for the tiles that select_tiles() sends to the VLM.
+    """
+    array = page.array
+    h, w = array.shape[:2]
+    tile_h = min(h, max(1, int(w * height_ratio)))
+    step = max(1, int(tile_h * (1 - TILE_OVERLAP)))
+
+    tops = list(range(0, h - tile_h + 1, step))
+    if tops[-1] + tile_h < h:
+        tops.append(h - tile_h)
+
+    stem = Path(page.name).stem
+    return [
+        ProcessedImage(
+            name=f"{stem}_tile{i + 1}.jpg",
+            array=array[top:top + tile_h],
+            data=b"",
+            origin=(0, top),
+        )
+        for i, top in enumerate(tops)
+    ]
+
+
+def header_bands(page: ProcessedImage) -> List[ProcessedImage]:
+    """
+    Overlapping full-width bands of a page, top first, for early-exit
+    classification OCR. The first band is HEADER_BAND_RATIO * width tall and
+    each next one doubles (up to the tile height), so a page read to the
+    end costs only a few more OCR calls than reading it whole.
+    """
+    array = page.array
+    h, w = array.shape[:2]
+    band_h = max(1, int(w * HEADER_BAND_RATIO))
+    max_h = max(band_h, int(w * TILE_HEIGHT_RATIO))
+    stem = Path(page.name).stem
+
+    bands = []
+    top = 0
+    while True:
+        bottom = min(h, top + band_h)
+        bands.append(ProcessedImage(
+            name=f"{stem}_band{len(bands) + 1}.jpg",
+            array=array[top:bottom],
+            data=b"",
+            origin=(0, top),
+        ))
+        if bottom >= h:
+            return bands
+        top = bottom - int(band_h * TILE_OVERLAP)
+        band_h = min(band_h * 2, max_h)
+
+
+def tile_bounds(tiles: List[ProcessedImage]) -> List[Tuple[int, int]]:
+    """
+    Page y-range owned by each tile: every overlap is split at its midpoint,
+    so each text line is kept from exactly one tile.
+    """
+    spans = [(t.origin[1], t.origin[1] + t.array.shape[0]) for t in tiles]
+    bounds = []
+    for i, (top, bottom) in enumerate(spans):
+        own_top = 0 if i == 0 else (top + spans[i - 1][1]) // 2
+        own_bottom = bottom if i == len(spans) - 1 else (spans[i + 1][0] + bottom) // 2
+        bounds.append((own_top, own_bottom))
+    return bounds
+
+
+def select_tiles(page) -> list:
+    """
+    For a tiled page, return only the tiles whose OCR text looks relevant
+    (amounts, payment keywords), encoded for the VLM. Other pages are
+    returned whole, as are tiled pages where no tile (or every tile) is
+    relevant.
+    """
+    if not needs_tiling(page) or page.tile_texts is None:
+        return [page]
+
+    tiles = split_tiles(page)
+    if len(tiles) != len(page.tile_texts):
+        return [page]
+
+    keep = [
+        tile for tile, text in zip(tiles, page.tile_texts)
+        if RELEVANT_TILE_PATTERN.search(text)
+    ]
+    # nothing to drop (or nothing found): the whole page is cheaper
+    if not keep or len(keep) == len(tiles):
+        return [page]
+
+    for tile in keep:
+        tile.data = _encode_jpeg(tile.array)
+    return keep
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _render_pool
+
+
+def _is_receipt_char(c: str) -> bool:
+    o = ord(c)
+    return (
+        o < 128
+        or 0x4E00 <= o <= 0x9FFF  # CJK unified ideographs
+        or 0x3000 <= o <= 0x303F  # CJK punctuation
+        or 0xFF00 <= o <= 0xFFEF  # full-width forms
+        or c in "·¥￥—“”‘’…"
+    )
+
+
+def _page_text_layer(page: "fitz.Page") -> Optional[TextLayer]:
+    chars = "".join(page.get_text().split())
+    if len(chars) < MIN_TEXT_LAYER_CHARS:
+        return None
+    if sum(map(_is_receipt_char, chars)) / len(chars) < MIN_TEXT_LAYER_RATIO:
+        return None
+
+    lines = [" ".join(line.split()) for line in page.get_text(sort=True).splitlines()]
+    words = [
+        (x0 * PDF_ZOOM, y0 * PDF_ZOOM, x1 * PDF_ZOOM, y1 * PDF_ZOOM, word)
+        for x0, y0, x1, y1, word, *_ in page.get_text("words", sort=True)
+    ]
+    return TextLayer(text="\n".join(l for l in lines if l), words=words)
+
+
+def extract_text_layer(input_path: Path, page_index: int = 0) -> Optional[TextLayer]:
+    """Return the text layer of a PDF page, or None if it is missing or unusable."""
+    doc = fitz.open(input_path)
+    try:
+        return _page_text_layer(doc[page_index])
+    finally:
+        doc.close()
+
+
+def is_passthrough_jpeg(img: Image.Image) -> bool:
+    """
+    True if an opened (not yet decoded) image is a baseline RGB JPEG of
+    reasonable size with no EXIF rotation, i.e. it needs no transform.
+    Only header fields are inspected.
+    """
+    return (
+        img.format == "JPEG"
+        and img.mode == "RGB"
+        and max(img.size) <= PASSTHROUGH_MAX_SIDE
+        and not img.info.get("progressive")
+        and img.getexif().get(EXIF_ORIENTATION, 1) == 1
+    )
+
+
+def _fresh_output(out_path: Path) -> Path:
+    # outputs may be hard-linked into the preprocess cache;
+    # unlink first so writing never modifies a cached entry in place
+    out_path.unlink(missing_ok=True)
+    return out_path
+
+
+def _render_pdf_page(
+    input_path: Path,
+    page_index: int,
+    name: str,
+    output_dir: Optional[Path],
+    in_memory: bool = False,
+) -> Union[Path, ProcessedImage]:
+    """
+    Render one PDF page to JPG.
+    Kept at module level so it can be sent to a worker process.
+    """
+    doc = fitz.open(input_path)
+    try:
+        page = doc[page_index]
+        pix = page.get_pixmap(matrix=fitz.Matrix(PDF_ZOOM, PDF_ZOOM))
+
+        if not in_memory:
+            out_path = _fresh_output(output_dir / name)
+            pix.save(out_path, jpg_quality=JPEG_QUALITY)
+            return out_path
+
+        data = pix.tobytes("jpeg", jpg_quality=JPEG_QUALITY)
+        # view the pixmap memory directly: no copy, no JPEG round trip
+        array = np.asarray(_PixmapView(pix))
+        text_layer = _page_text_layer(page)
+    finally:
+        doc.close()
+
+    processed = _make_processed(name, array, data, output_dir)
+    processed.text_layer = text_layer
+    return processed
+
+
+def _make_processed(
+    name: str, array: np.ndarray, data: bytes, output_dir: Optional[Path]
+) -> ProcessedImage:
+    out_path = None
+    if output_dir is not None:
+        out_path = _fresh_output(output_dir / name)
+        out_path.write_bytes(data)
+    return ProcessedImage(name=name, array=array, data=data, path=out_path)
+
+
+def _pdf_page_count(input_path: Path) -> int:
+    doc = fitz.open(input_path)
+    page_count = len(doc)
+    doc.close()
+    if page_count == 0:
+        raise ValueError(f"PDF has no pages: {input_path}")
+    return page_count
+
+
+def _render_settings(mode: str) -> str:
+    return f"{mode};zoom={PDF_ZOOM};quality={JPEG_QUALITY};exif_transpose"
+
+
+def _page_names(input_path: Path, page_count: int) -> List[str]:
+    if input_path.suffix.lower() != ".pdf":
+        return [f"{input_path.stem}.jpg"]
+    return [f"{input_path.stem}_page{i + 1}.jpg" for i in range(page_count)]
+
+
+def _from_cache(
+    input_path: Path,
+    cached: List[Path],
+    names: List[str],
+    output_dir: Optional[Path],
+    in_memory: bool,
+) -> List[Union[Path, ProcessedImage]]:
+    is_pdf = input_path.suffix.lower() == ".pdf"
+    results = []
+    for page_index, (cached_path, name) in enumerate(zip(cached, names)):
+        out_path = None
+        if output_dir is not None:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            out_path = link_or_copy(cached_path, output_dir / name)
+
+        if not in_memory:
+            results.append(out_path)
+            continue
+
+        data = cached_path.read_bytes()
+        img = Image.open(io.BytesIO(data))
+        array = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+        # text layers are cheap to re-read, so they are not cached
+        text_layer = extract_text_layer(input_path, page_index) if is_pdf else None
+        results.append(ProcessedImage(
+            name=name, array=array, data=data, path=out_path, text_layer=text_layer
+        ))
+    return results
+
+
+def _to_cache(cache: PreprocessCache, key: str, results: list):
+    cache.put(key, [r.data if isinstance(r, ProcessedImage) else r for r in results])
+
+
+def preprocess_file(
+    input_path: Path,
+    output_dir: Optional[Path],
+    in_memory: bool = False,
+    cache: Optional[PreprocessCache] = None,
+) -> Union[Path, ProcessedImage]:
     """
     Process a single input file (PDF / JPG / PNG) and output a JPG file.
     Returns the output JPG path.
+
+    With in_memory=True a ProcessedImage is returned instead and the disk
+    copy is only written when output_dir is given; digital PDFs also carry
+    their text layer so OCR can be skipped. When a cache is passed,
+    previously rendered inputs are served from it.
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
+    if output_dir is None and not in_memory:
+        raise ValueError("output_dir is required unless in_memory=True")
+
+    if cache is None:
+        return _preprocess_file(input_path, output_dir, in_memory)
+
+    key = cache.key(input_path, _render_settings("first"))
+    cached = cache.get(key)
+    if cached is not None:
+        names = _page_names(input_path, 1)
+        try:
+            return _from_cache(input_path, cached[:1], names, output_dir, in_memory)[0]
+        except FileNotFoundError:
+            pass  # evicted by another worker since get(): render again
+
+    result = _preprocess_file(input_path, output_dir, in_memory)
+    _to_cache(cache, key, [result])
+    return result
+
+
+def _preprocess_file(
+    input_path: Path,
+    output_dir: Optional[Path],
+    in_memory: bool = False,
+) -> Union[Path, ProcessedImage]:
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
 
     suffix = input_path.suffix.lower()
 
     # ---- PDF ----
     if suffix == ".pdf":
         # Always convert only page 1 for processing
-        doc = fitz.open(input_path)
-        if len(doc) == 0:
-            raise ValueError(f"PDF has no pages: {input_path}")
-
-        page = doc[0]
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        out_path = output_dir / f"{input_path.stem}_page1.jpg"
-        pix.save(out_path)
-        doc.close()
-        return out_path
+        _pdf_page_count(input_path)
+        name = _page_names(input_path, 1)[0]
+        return _render_pdf_page(input_path, 0, name, output_dir, in_memory)
 
     # ---- Image (jpg/png) ----
     elif suffix in [".jpg", ".jpeg", ".png"]:
-        img = Image.open(input_path).convert("RGB")
-        out_path = output_dir / f"{input_path.stem}.jpg"
-        img.save(out_path, "JPEG", quality=95)
-        return out_path
+        img = Image.open(input_path)
+        name = _page_names(input_path, 1)[0]
+
+        # ---- Already compliant: reference the original file ----
+        if is_passthrough_jpeg(img):
+            out_path = None
+            if output_dir is not None:
+                out_path = link_or_copy(input_path, _fresh_output(output_dir / name))
+            if not in_memory:
+                return out_path
+            return ProcessedImage(
+                name=name,
+                array=np.asarray(img),
+                data=input_path.read_bytes(),
+                path=out_path,
+            )
+
+        # bake the EXIF rotation into the pixels; the OCR engine ignores the tag
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        if not in_memory:
+            out_path = _fresh_output(output_dir / name)
+            img.save(out_path, "JPEG", quality=JPEG_QUALITY)
+            return out_path
+
+        return _make_processed(name, np.asarray(img), _encode_jpeg(img), output_dir)
 
     else:
         raise ValueError(f"Unsupported file type: {input_path}")
 
 
+def preprocess_pages(
+    input_path: Path,
+    output_dir: Optional[Path],
+    parallel: bool = True,
+    in_memory: bool = False,
+    cache: Optional[PreprocessCache] = None,
+) -> List[Union[Path, ProcessedImage]]:
+    """
+    Page-aware variant of preprocess_file: returns one JPG per page.
+    Multi-page PDFs are rendered in a process pool (unless parallel=False);
+    images always yield a single page.
+    """
+    if output_dir is None and not in_memory:
+        raise ValueError("output_dir is required unless in_memory=True")
+
+    if cache is None:
+        return _preprocess_pages(input_path, output_dir, parallel, in_memory)
+
+    # images have a single page, so share the entry with preprocess_file
+    mode = "pages" if input_path.suffix.lower() == ".pdf" else "first"
+    key = cache.key(input_path, _render_settings(mode))
+    cached = cache.get(key)
+    if cached is not None:
+        names = _page_names(input_path, len(cached))
+        try:
+            return _from_cache(input_path, cached, names, output_dir, in_memory)
+        except FileNotFoundError:
+            pass  # evicted by another worker since get(): render again
+
+    results = _preprocess_pages(input_path, output_dir, parallel, in_memory)
+    _to_cache(cache, key, results)
+    return results
+
+
+def _preprocess_pages(
+    input_path: Path,
+    output_dir: Optional[Path],
+    parallel: bool = True,
+    in_memory: bool = False,
+) -> List[Union[Path, ProcessedImage]]:
+    if input_path.suffix.lower() != ".pdf":
+        return [_preprocess_file(input_path, output_dir, in_memory)]
+
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    page_count = _pdf_page_count(input_path)
+    names = _page_names(input_path, page_count)
+
+    if not parallel or page_count == 1:
+        return [
+            _render_pdf_page(input_path, i, name, output_dir, in_memory)
+            for i, name in enumerate(names)
+        ]
+
+    pool = _get_render_pool()
+    futures = [
+        pool.submit(_render_pdf_page, input_path, i, name, output_dir, in_memory)
+        for i, name in enumerate(names)
+    ]
+    return [f.result() for f in futures]
+
+
+
+def estimate_pixels(input_path: Path, all_pages: bool = True) -> int:
+    """Decoded pixel count of an input, read from headers only."""
+    if input_path.suffix.lower() == ".pdf":
+        doc = fitz.open(input_path)
+        try:
+            pages = doc if all_pages else doc[:1]
+            return int(sum(p.rect.width * p.rect.height for p in pages) * PDF_ZOOM ** 2)
+        finally:
+            doc.close()
+
+    with Image.open(input_path) as img:
+        w, h = img.size
+    return w * h
+
+
+def _preprocess_worker(
+    input_path: Path,
+    output_dir: Optional[Path],
+    all_pages: bool,
+    in_memory: bool,
+    cache: Optional[PreprocessCache],
+):
+    # the cache is a per-task copy; report counter deltas back to the parent
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+
+    if all_pages:
+        result = preprocess_pages(input_path, output_dir, False, in_memory, cache)
+    else:
+        result = preprocess_file(input_path, output_dir, in_memory, cache)
+
+    if cache is None:
+        return result, 0, 0
+    return result, cache.hits - hits, cache.misses - misses
+
+
+def iter_preprocess(
+    files: Iterable[Path],
+    output_dir: Optional[Path],
+    all_pages: bool = True,
+    in_memory: bool = False,
+    cache: Optional[PreprocessCache] = None,
+    max_workers: Optional[int] = None,
+    max_pixels: int = MAX_PIXELS_IN_FLIGHT,
+) -> Iterator[Tuple[Path, Union[Path, ProcessedImage, list]]]:
+    """
+    Preprocess many files in a process pool, yielding (input file, result)
+    as each one completes.
+
+    A file is only submitted while the estimated decoded pixels of running
+    tasks plus the result being consumed stay under max_pixels (one file is
+    always allowed, however large). Files that fail are reported and skipped.
+    This bounds memory only if the caller does not keep decoded results:
+    release() in-memory pages that are held past the next iteration (their
+    pixels are then kept compressed, losslessly).
+    """
+    pending = deque(files)
+    in_flight = {}  # future -> (file, pixels)
+    held = 0
+    next_pixels = None
+
+    with ProcessPoolExecutor(max_workers=max_workers or PREPROCESS_WORKERS) as pool:
+        while pending or in_flight:
+            # ---- Submit while under the pixel budget ----
+            while pending:
+                if next_pixels is None:
+                    try:
+                        next_pixels = estimate_pixels(pending[0], all_pages)
+                    except Exception:
+                        next_pixels = 0  # let the worker report the error
+                if in_flight and held + next_pixels > max_pixels:
+                    break
+
+                file = pending.popleft()
+                future = pool.submit(
+                    _preprocess_worker, file, output_dir, all_pages, in_memory, cache
+                )
+                in_flight[future] = (file, next_pixels)
+                held += next_pixels
+                next_pixels = None
+
+            # ---- Stream finished files ----
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file, pixels = in_flight.pop(future)
+                try:
+                    result, hits, misses = future.result()
+                except Exception as e:
+                    print(f"[WARNING] Cannot process {file}: {e}")
+                else:
+                    if cache is not None:
+                        cache.hits += hits
+                        cache.misses += misses
+                    yield file, result
+                held -= pixels
+
+
 
 class PreProcessor:
-    """Batch processing class."""
+    """Batch processing class, backed by iter_preprocess."""
 
-    def __init__(self, input_dir: str, output_dir: str = "data/processed"):
+    def __init__(
+        self,
+        input_dir: str,
+        output_dir: str = "data/processed",
+        max_workers: Optional[int] = None,
+        max_pixels: int = MAX_PIXELS_IN_FLIGHT,
+    ):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.max_pixels = max_pixels
 
-    def run(self) -> List[Path]:
-        processed_paths = []
+    def iter_run(self, all_pages: bool = False) -> Iterator[Tuple[Path, Union[Path, List[Path]]]]:
+        """Stream (input file, output) pairs in completion order."""
+        return iter_preprocess(
+            self.input_dir.iterdir(),
+            self.output_dir,
+            all_pages=all_pages,
+            max_workers=self.max_workers,
+            max_pixels=self.max_pixels,
+        )
 
-        for file in self.input_dir.iterdir():
-            try:
-                processed_paths.append(
-                    preprocess_file(file, self.output_dir)
-                )
-            except Exception as e:
-                print(f"[WARNING] Cannot process {file}: {e}")
+    def run(self) -> List[Path]:
+        return [out for _, out in self.iter_run()]
 
-        return processed_paths
+    def run_pages(self) -> List[List[Path]]:
+        """Like run(), but keeps every page: one list of page paths per file."""
+        return [pages for _, pages in self.iter_run(all_pages=True)]
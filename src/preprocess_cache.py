@@ -0,0 +1,127 @@
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Optional, Union
+
+EVICT_TO = 0.9  # eviction frees space down to this share of max_bytes
+
+
+def link_or_copy(src: Path, dst: Path) -> Path:
+    """Hard-link src to dst, falling back to a copy across filesystems."""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+    return dst
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir())
+
+
+def _page_number(path: Path) -> int:
+    return int(path.stem[len("page"):])
+
+
+class PreprocessCache:
+    """
+    Content-addressed cache of preprocessed pages.
+
+    Each entry is a directory named by the hash of the input bytes plus the
+    render settings, holding page1.jpg, page2.jpg, ... Entries are evicted
+    least-recently-used first (by directory mtime) once the cache grows past
+    max_bytes, down to EVICT_TO * max_bytes so that the directory is only
+    rescanned once per few puts. Several worker processes may share the
+    directory: an entry removed by another worker is simply a miss.
+    """
+
+    def __init__(self, cache_dir: str = "data/processed/cache", max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total = None  # estimated bytes stored; None until first scanned
+
+    def key(self, input_path: Path, settings: str) -> str:
+        h = hashlib.sha256()
+        with open(input_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        h.update(settings.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Path]]:
+        entry = self.cache_dir / key
+        pages = sorted(entry.glob("page*.jpg"), key=_page_number) if entry.is_dir() else []
+        if not pages:
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(entry)  # mark as recently used
+        except FileNotFoundError:  # evicted by another worker meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pages
+
+    def put(self, key: str, pages: List[Union[Path, bytes]]) -> List[Path]:
+        entry = self.cache_dir / key
+        tmp = self.cache_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+
+        for i, page in enumerate(pages):
+            dst = tmp / f"page{i + 1}.jpg"
+            if isinstance(page, bytes):
+                dst.write_bytes(page)
+            else:
+                link_or_copy(page, dst)
+
+        size = _dir_size(tmp)
+        try:
+            tmp.rename(entry)
+        except OSError:
+            # another worker stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+            size = 0
+
+        if self._total is None:
+            self._total = self.size_bytes()
+        else:
+            self._total += size
+        if self._total > self.max_bytes:
+            self._evict(keep=key)
+        return sorted(entry.glob("page*.jpg"), key=_page_number)
+
+    def size_bytes(self) -> int:
+        return sum(size for _, _, size in self._scan())
+
+    def _scan(self) -> List[tuple]:
+        """(mtime, entry, size) per entry; entries vanishing meanwhile are skipped."""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if entry.name.startswith("."):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry, _dir_size(entry)))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return entries
+
+    def _evict(self, keep: str):
+        # rescan: other workers' puts and evictions are not in self._total
+        entries = sorted(self._scan(), key=lambda e: e[0])
+        total = sum(size for _, _, size in entries)
+        for _, entry, size in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        self._total = total
@@ -1,112 +1,189 @@
 from pathlib import Path
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from difflib import SequenceMatcher
-from rapidocr_onnxruntime import RapidOCR
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from src.fuzzy_match import KeywordMatcher
+from src.template_index import TemplateIndex, layout_fingerprint, vendor_of
+# OCR lives in the shared engine module; re-exported for existing callers
+from src.ocr_engine import OcrResult, iter_ocr_regions, run_ocr, run_ocr_async
+
+# header-first classification stops reading once the leading type has at
+# least EARLY_EXIT_SCORE keywords and leads the runner-up by EARLY_EXIT_MARGIN
+EARLY_EXIT_SCORE = 3
+EARLY_EXIT_MARGIN = 2
+
+
+# Keyword sets
+KEYWORDS = {
+    "itinerary": [
+        "起点", "终点", "公里", "行程", "出行",
+        "快车", "特惠快车", "专车",
+        "itinerary", "route", "km", "distance"
+    ],
+    "hotel_invoice": [
+        "酒店", "到店", "房间", "房费",
+        "入住", "离店", "房价", "房号", "住宿",
+        "hotel", "room", "check-in", "check out", "guest"
+    ],
+    "payment": [
+        "支付", "支付方式",
+        "payment", "payment method",
+        "付款", "金额", "交易"
+    ],
+}
+FUZZY_THRESHOLD = 0.75
 
-ocr = RapidOCR(
-    lang="ch",
-    providers=["CUDAExecutionProvider", "CPUExecutionProvider"]
+_matcher = KeywordMatcher(
+    [kw for keywords in KEYWORDS.values() for kw in keywords], FUZZY_THRESHOLD
 )
 
-ocr_executor = ThreadPoolExecutor(max_workers=8)
 
+# compiled once per (keyword, threshold) across fuzzy_contains calls
+@lru_cache(maxsize=256)
+def _keyword_matcher(keyword: str, threshold: float) -> KeywordMatcher:
+    return KeywordMatcher([keyword], threshold)
 
-def run_ocr(path: Path) -> str:
-    result, _ = ocr(str(path))
-    if result:
-        return "\n".join([line[1] for line in result])
-    return ""
 
+def fuzzy_contains(text: str, keyword: str, threshold: float = FUZZY_THRESHOLD) -> bool:
+    keyword = keyword.lower()
+    return keyword in _keyword_matcher(keyword, threshold).find(text)
 
-async def run_ocr_async(path: Path) -> str:
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(ocr_executor, run_ocr, path)
 
+def rule_scores(text: str) -> Dict[str, int]:
+    """Number of keywords of each document type found (fuzzily) in `text`."""
+    found = _matcher.find(text.lower())
+    return {
+        doc_type: sum(1 for kw in keywords if kw.lower() in found)
+        for doc_type, keywords in KEYWORDS.items()
+    }
 
 
-def fuzzy_contains(text: str, keyword: str, threshold: float = 0.75) -> bool:
-    keyword = keyword.lower()
+def _decide(scores: Dict[str, int]) -> str:
+    best_type = max(scores, key=scores.get)
+    best_score = scores[best_type]
 
-    # exact match
-    if keyword in text:
-        return True
+    if best_score >= 2:
+        return best_type
 
-    # fuzzy match sliding window
-    window = len(keyword)
-    for i in range(len(text) - window + 1):
-        piece = text[i:i + window]
-        if SequenceMatcher(None, piece, keyword).ratio() >= threshold:
-            return True
+    return "other"
 
-    return False
 
+def score_margin(scores: Dict[str, int]) -> int:
+    """Lead of the best type over the runner-up, in keywords."""
+    best, runner_up = sorted(scores.values(), reverse=True)[:2]
+    return best - runner_up
 
-async def rule_classify(text: str) -> str:
-    if len(text.strip()) < 3:
-        return "other"
 
-    text = text.lower()
+def is_confident(scores: Dict[str, int]) -> bool:
+    return max(scores.values()) >= EARLY_EXIT_SCORE and score_margin(scores) >= EARLY_EXIT_MARGIN
 
-    # Keyword sets
-    itinerary_keywords = [
-        "起点", "终点", "公里", "行程", "出行",
-        "快车", "特惠快车", "专车",
-        "itinerary", "route", "km", "distance"
-    ]
-
-    hotel_keywords = [
-        "酒店", "到店", "房间", "房费",
-        "入住", "离店", "房价", "房号", "住宿",
-        "hotel", "room", "check-in", "check out", "guest"
-    ]
-
-    payment_keywords = [
-        "支付", "支付方式",
-        "payment", "payment method",
-        "付款", "金额", "交易"
-    ]
 
-    # scoring
-    def score_keywords(keywords):
-        return sum(1 for kw in keywords if fuzzy_contains(text, kw))
+def classify_text(text: str) -> Tuple[str, Dict[str, int]]:
+    """(type, per-type keyword scores) for one OCR text; synchronous."""
+    if len(text.strip()) < 3:
+        return "other", {doc_type: 0 for doc_type in KEYWORDS}
+    scores = rule_scores(text)
+    return _decide(scores), scores
 
-    itinerary_score = score_keywords(itinerary_keywords)
-    hotel_score = score_keywords(hotel_keywords)
-    payment_score = score_keywords(payment_keywords)
 
-    scores = {
-        "itinerary": itinerary_score,
-        "hotel_invoice": hotel_score,
-        "payment": payment_score,
-    }
+def classify_texts(texts: List[str]) -> List[Tuple[str, Dict[str, int]]]:
+    return [classify_text(t) for t in texts]
 
-    best_type = max(scores, key=scores.get)
-    best_score = scores[best_type]
 
-    if best_score >= 2:
-        return best_type
+async def rule_classify_batch(
+    texts: List[str], executor: Optional[Executor] = None
+) -> List[Tuple[str, Dict[str, int]]]:
+    """
+    Classify many OCR texts in one call, off the event loop: the keyword
+    matching runs in `executor` (the loop's default thread pool if None;
+    a ProcessPoolExecutor also works). Returns (type, scores) per text.
+    """
+    if not texts:
+        return []
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, classify_texts, texts)
 
-    return "other"
 
+async def rule_classify(text: str) -> str:
+    return (await rule_classify_batch([text]))[0][0]
+
+
+@dataclass
+class RegionClassification:
+    """
+    Result of rule_classify_regions. `vendor` is the matched template's,
+    else looked up in the text read; `rule_seconds` excludes the OCR.
+    """
+    type: str
+    scores: Optional[Dict[str, int]]  # None: decided by a template
+    text: str  # the text read
+    vendor: Optional[str] = None
+    rule_seconds: float = 0.0
+
+
+async def rule_classify_regions(
+    pages: list, templates: Optional[TemplateIndex] = None, first: Optional[OcrResult] = None
+) -> RegionClassification:
+    """
+    Header-first classification: OCR the document region by region from the
+    top and stop as soon as the keyword scores are confident. Falls back to
+    classifying everything read. `first` is the first region if already
+    OCR'd (see ocr_first_regions).
+
+    With a template index, the first region's layout fingerprint is looked
+    up first; a match returns its type and vendor with scores None, unless
+    the keyword rules read that region as another type: then the match is
+    rejected (see TemplateIndex.reject) and classification goes on as
+    without one. Documents the rules classify confidently are added as
+    templates.
+    """
+    loop = asyncio.get_running_loop()
+    texts = []
+    fingerprint = None
+    rule_seconds = 0.0
+    doc_type, scores = classify_text("")
+    async for result in iter_ocr_regions(pages, first=first):
+        start = time.perf_counter()
+        if templates is not None and not texts:
+            fingerprint = layout_fingerprint(result)
+            match = templates.match(fingerprint)
+            if match is not None:
+                band_type, _ = await loop.run_in_executor(None, classify_text, result.text)
+                if band_type in (match.type, "other"):  # "other": too little text to judge
+                    rule_seconds += time.perf_counter() - start
+                    return RegionClassification(match.type, None, result.text, match.vendor, rule_seconds)
+                templates.reject(match)
+
+        texts.append(result.text)
+        doc_type, scores = await loop.run_in_executor(None, classify_text, "\n".join(texts))
+        rule_seconds += time.perf_counter() - start
+        if is_confident(scores):
+            if templates is not None:
+                templates.add(fingerprint, doc_type, vendor_of(texts[0]))
+            break
+    text = "\n".join(texts)
+    return RegionClassification(doc_type, scores, text, vendor_of(text), rule_seconds)
 
 
 async def classification_one(image_path: Path) -> dict:
-    text = await run_ocr_async(image_path)
-    doc_type = await rule_classify(text)
+    ocr = await run_ocr_async(image_path)
+    doc_type = await rule_classify(ocr.text)
     return {"file": str(image_path), "type": doc_type}
 
 
 async def classification_batch(image_paths: list[Path]) -> list[dict]:
     # parallel OCR
     ocr_tasks = [run_ocr_async(p) for p in image_paths]
-    texts = await asyncio.gather(*ocr_tasks)
+    results = await asyncio.gather(*ocr_tasks)
 
-    # parallel classification
-    classify_tasks = [rule_classify(t) for t in texts]
-    types = await asyncio.gather(*classify_tasks)
+    # batch classification, off the event loop
+    classified = await rule_classify_batch([r.text for r in results])
 
     return [
-        {"file": str(p), "type": t}
-        for p, t in zip(image_paths, types)
+        {"file": str(p), "type": t, "scores": scores}
+        for p, (t, scores) in zip(image_paths, classified)
     ]
@@ -3,8 +3,11 @@ import base64
 import json
 import asyncio
 from pathlib import Path
+from typing import List, Union
 import httpx
 
+from src.pre_processor import ProcessedImage
+
 
 BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
 API_KEY_ENV = "OPENAI_API_KEY"
@@ -13,22 +16,37 @@ MODEL_NAME = "qwen3-vl-8b-instruct"
 SEM_EXTRACT = asyncio.Semaphore(5)
 
 
-def make_data_url_sync(path: Path):
+def make_data_url_sync(path: Union[Path, ProcessedImage]):
+    if isinstance(path, ProcessedImage):
+        b64 = base64.b64encode(path.data).decode()
+        return f"data:{path.mime};base64,{b64}"
+
     suffix = path.suffix.lower()
     mime = "image/jpeg" if suffix in (".jpg", ".jpeg") else "image/png"
     b64 = base64.b64encode(path.read_bytes()).decode()
     return f"data:{mime};base64,{b64}"
 
 
-async def make_data_url(path: Path):
+async def make_data_url(path: Union[Path, ProcessedImage]):
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(None, make_data_url_sync, path)
 
 
-async def run_one_file(image_path: Path, prompt_path: Path) -> dict:
+async def run_one_file(
+    image_path: Union[Path, ProcessedImage, List[Union[Path, ProcessedImage]]],
+    prompt_path: Path,
+) -> dict:
+    """
+    Extract fields from one document.
+    `image_path` may be a single image or the list of page images of a
+    multi-page document; every page is sent in the same request.
+    """
     api_key = os.getenv(API_KEY_ENV)
     prompt = Path(prompt_path).read_text(encoding="utf-8")
-    data_url = await make_data_url(image_path)
+
+    pages = image_path if isinstance(image_path, list) else [image_path]
+    image_path = pages[0]
+    data_urls = await asyncio.gather(*[make_data_url(p) for p in pages])
 
     payload = {
         "model": MODEL_NAME,
@@ -37,7 +55,10 @@ async def run_one_file(image_path: Path, prompt_path: Path) -> dict:
                 "role": "user",
                 "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": data_url}},
+                    *[
+                        {"type": "image_url", "image_url": {"url": url}}
+                        for url in data_urls
+                    ],
                 ],
             }
         ],
@@ -0,0 +1,181 @@
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.ngram_classifier import featurize
+from src.ocr_engine import OcrResult
+
+TEMPLATE_INDEX_PATH = Path(os.getenv("TEMPLATE_INDEX_PATH", "data/template_index.npz"))
+# cosine similarity a document's header needs to a known template to
+# take its type without keyword scoring
+TEMPLATE_MIN_SIMILARITY = float(os.getenv("TEMPLATE_MIN_SIMILARITY", "0.9"))
+# a template the keyword rules contradict this often is dropped (and can
+# be relearnt from the next confident document)
+TEMPLATE_MAX_DISAGREEMENTS = int(os.getenv("TEMPLATE_MAX_DISAGREEMENTS", "2"))
+MAX_TEMPLATES = 2000
+
+# layout part: share of box area per cell of a GRID_ROWS x GRID_COLS grid
+# over the boxes' extent; token part: hashed character n-grams of the
+# header text with digits dropped (dates and amounts vary per document)
+GRID_ROWS, GRID_COLS = 6, 4
+TOKEN_HASH_BITS = 7
+LAYOUT_WEIGHT = 0.5
+FINGERPRINT_DIM = GRID_ROWS * GRID_COLS + (1 << TOKEN_HASH_BITS)
+_NON_TOKEN = re.compile(r"[\d\W_]+")
+
+# vendor names looked up in the header text when a template is learnt
+VENDORS = {
+    # ride-hailing aggregators first: their itineraries also name the carrier
+    "baidu": ("百度",),
+    "amap": ("高德",),
+    "ctrip": ("携程", "ctrip"),
+    "didi": ("滴滴",),
+    "caocao": ("曹操",),
+    "huaxiaozhu": ("花小猪",),
+    "hilton": ("希尔顿", "康莱德", "hilton", "conrad"),
+    "marriott": ("万豪", "万怡", "万丽", "喜来登", "福朋", "瑞吉", "ac酒店", "marriott", "sheraton"),
+    "ihg": ("洲际", "皇冠假日", "假日酒店", "intercontinental", "holiday inn"),
+    "wechat": ("微信",),
+    "alipay": ("支付宝",),
+}
+
+
+def vendor_of(text: str) -> Optional[str]:
+    text = text.lower()
+    for vendor, names in VENDORS.items():
+        if any(name in text for name in names):
+            return vendor
+    return None
+
+
+def layout_fingerprint(result: OcrResult) -> Optional[np.ndarray]:
+    """
+    Unit vector describing where the text sits in a region (box area per
+    grid cell, relative to the boxes' extent, so scale and margins do not
+    matter) and what the header says. None for a region without text.
+    """
+    if len(result) == 0:
+        return None
+
+    xs, ys = result.boxes[:, :, 0], result.boxes[:, :, 1]
+    x0, x1, y0, y1 = xs.min(axis=1), xs.max(axis=1), ys.min(axis=1), ys.max(axis=1)
+    width = max(float(x1.max() - x0.min()), 1.0)
+    height = max(float(y1.max() - y0.min()), 1.0)
+    col = np.minimum(((x0 + x1) / 2 - x0.min()) / width * GRID_COLS, GRID_COLS - 1).astype(int)
+    row = np.minimum(((y0 + y1) / 2 - y0.min()) / height * GRID_ROWS, GRID_ROWS - 1).astype(int)
+    layout = np.bincount(row * GRID_COLS + col, weights=(x1 - x0) * (y1 - y0), minlength=GRID_ROWS * GRID_COLS)
+    layout /= np.linalg.norm(layout) or 1.0
+
+    tokens = np.zeros(1 << TOKEN_HASH_BITS)
+    _, feature, value = featurize([_NON_TOKEN.sub(" ", result.text)], TOKEN_HASH_BITS)
+    tokens[feature] = value
+
+    vec = np.concatenate([LAYOUT_WEIGHT * layout, (1 - LAYOUT_WEIGHT) * tokens]).astype(np.float32)
+    return vec / (np.linalg.norm(vec) or 1.0)
+
+
+@dataclass
+class TemplateMatch:
+    type: str
+    vendor: Optional[str]
+    similarity: float
+    index: int = -1  # row in the TemplateIndex
+
+
+class TemplateIndex:
+    """
+    Known document layouts (fingerprint, type, vendor), matched by cosine
+    nearest neighbour. Templates are learnt from documents the keyword
+    rules classify confidently and kept in a .npz file between runs.
+    Callers report matches the rules contradict with reject(); each
+    template keeps its count of those and is dropped at
+    TEMPLATE_MAX_DISAGREEMENTS.
+    """
+
+    def __init__(self, path: Optional[Path] = TEMPLATE_INDEX_PATH, min_similarity: float = TEMPLATE_MIN_SIMILARITY):
+        self.path = path
+        self.min_similarity = min_similarity
+        self.vectors = np.zeros((0, FINGERPRINT_DIM), dtype=np.float32)
+        self.types = []
+        self.vendors = []
+        self.disagreements = np.zeros(0, dtype=np.int32)
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.rejected = 0
+        self.removed = 0
+
+        if path is not None and path.exists():
+            with np.load(path) as data:
+                if data["vectors"].shape[1] == FINGERPRINT_DIM:  # else: fingerprint changed, relearn
+                    self.vectors = data["vectors"]
+                    self.types = [str(t) for t in data["types"]]
+                    self.vendors = [str(v) or None for v in data["vendors"]]
+                    self.disagreements = (
+                        data["disagreements"] if "disagreements" in data.files
+                        else np.zeros(len(self.types), dtype=np.int32)
+                    )
+
+    def __len__(self):
+        return len(self.types)
+
+    def nearest(self, vec: np.ndarray) -> Optional[TemplateMatch]:
+        if not len(self):
+            return None
+        sims = self.vectors @ vec
+        best = int(np.argmax(sims))
+        return TemplateMatch(self.types[best], self.vendors[best], float(sims[best]), best)
+
+    def match(self, vec: Optional[np.ndarray]) -> Optional[TemplateMatch]:
+        """The nearest template if it is similar enough, else None."""
+        found = self.nearest(vec) if vec is not None else None
+        if found is None or found.similarity < self.min_similarity:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return found
+
+    def reject(self, match: TemplateMatch):
+        """A match the keyword rules contradict: not a hit, and counted against the template."""
+        self.hits -= 1
+        self.rejected += 1
+        self.disagreements[match.index] += 1
+        if self.disagreements[match.index] >= TEMPLATE_MAX_DISAGREEMENTS:
+            self.vectors = np.delete(self.vectors, match.index, axis=0)
+            self.disagreements = np.delete(self.disagreements, match.index)
+            del self.types[match.index], self.vendors[match.index]
+            self.removed += 1
+
+    def add(self, vec: Optional[np.ndarray], doc_type: str, vendor: Optional[str] = None) -> bool:
+        """Learn a layout unless a template already covers it (or the index is full)."""
+        if vec is None or len(self) >= MAX_TEMPLATES:
+            return False
+        found = self.nearest(vec)
+        if found is not None and found.similarity >= self.min_similarity:
+            return False
+        self.vectors = np.vstack([self.vectors, vec[None]])
+        self.types.append(doc_type)
+        self.vendors.append(vendor)
+        self.disagreements = np.append(self.disagreements, 0).astype(np.int32)
+        self.added += 1
+        return True
+
+    def save(self):
+        if self.path is None or not (self.added or self.rejected):
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            self.path, vectors=self.vectors, types=np.array(self.types, dtype=str),
+            vendors=np.array([v or "" for v in self.vendors], dtype=str),
+            disagreements=self.disagreements,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "templates": len(self), "hits": self.hits, "misses": self.misses,
+            "added": self.added, "rejected": self.rejected, "removed": self.removed,
+        }
@@ -0,0 +1,96 @@
+"""
+Train the character n-gram classifier (src.ngram_classifier) offline.
+
+    python train_ngram_classifier.py [--outputs "outputs/output_*.json"] [--holdout 0.2]
+
+Labelled examples come from two places:
+- main.py result files (outputs/output_*.json): each result's `type`, with
+  the text re-read by OCR'ing its raw file from data/raw (thumbnails, as in
+  classification; the OCR cache makes repeat runs cheap);
+- the synthetic itineraries (generate_trips/artifacts/docx), labelled
+  "itinerary".
+
+A random holdout share is scored first (accuracy and texts/s); the model
+saved to NGRAM_MODEL_PATH is then trained on everything.
+"""
+import argparse
+import glob
+import json
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.artifacts import ARTIFACTS_DIR, docx_lines
+from src.ngram_classifier import NGRAM_MODEL_PATH, NgramClassifier
+from src.ocr_engine import run_ocr
+from src.pre_processor import make_thumbnail, preprocess_pages
+
+RAW_DIR = Path("data/raw")
+PAGE_SUFFIX = re.compile(r"_page\d+$")
+
+
+def output_examples(pattern: str) -> list:
+    """[(text, type), ...] from main.py result files, one per raw file (latest wins)."""
+    labels = {}
+    for path in sorted(glob.glob(pattern)):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        for r in data.get("results", []):
+            stem = PAGE_SUFFIX.sub("", Path(r["processed_file"]).stem)
+            labels[stem] = r["type"]
+
+    raw_files = {f.stem: f for f in RAW_DIR.iterdir()} if RAW_DIR.exists() else {}
+    examples = []
+    for stem, doc_type in sorted(labels.items()):
+        if stem not in raw_files:
+            print(f"[WARNING] no raw file for {stem}, skipping")
+            continue
+        pages = preprocess_pages(raw_files[stem], None, in_memory=True)
+        text = "\n".join(run_ocr(make_thumbnail(p)).text for p in pages)
+        examples.append((text, doc_type))
+    return examples
+
+
+def synthetic_examples(artifacts_dir: Path) -> list:
+    return [
+        ("\n".join(docx_lines(d)), "itinerary")
+        for d in sorted((artifacts_dir / "docx").glob("*.docx"))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--outputs", default="outputs/output_*.json", help="result files (glob)")
+    parser.add_argument("--artifacts-dir", type=Path, default=ARTIFACTS_DIR)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share held out for evaluation")
+    parser.add_argument("--model", type=Path, default=NGRAM_MODEL_PATH)
+    args = parser.parse_args()
+
+    examples = output_examples(args.outputs) + synthetic_examples(args.artifacts_dir)
+    texts = [t for t, _ in examples]
+    labels = [y for _, y in examples]
+    counts = {y: labels.count(y) for y in sorted(set(labels))}
+    print(f"📄 {len(examples)} examples: {counts}")
+    if len(counts) < 2:
+        raise ValueError(f"need at least two document types to train, got {counts}")
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(examples))
+    n_test = int(len(examples) * args.holdout)
+    if n_test:
+        test, train = order[:n_test], order[n_test:]
+        model = NgramClassifier.fit([texts[i] for i in train], [labels[i] for i in train])
+        start = time.perf_counter()
+        predicted = model.predict([texts[i] for i in test])
+        elapsed = time.perf_counter() - start
+        accuracy = np.mean([p == labels[i] for (p, _), i in zip(predicted, test)])
+        print(f"🎯 holdout accuracy {accuracy:.3f} on {n_test} texts, {n_test / elapsed:.0f} texts/s")
+
+    model = NgramClassifier.fit(texts, labels)
+    model.save(args.model)
+    print(f"📄 Model saved to: {args.model}")
+
+
+if __name__ == "__main__":
+    main()